@@ -0,0 +1,104 @@
+"""
+    Measures the bytes per cached video of the per-video state of the /stats
+    aggregates: pydantic Video models, a dict of tuples and the compact
+    VideoStore in vids_db_server.compact.
+
+    Every cache is built from json.loads() of the stored rows, as read from
+    the database, so no string is shared with the source data and all the
+    strings a cache keeps alive are counted.
+
+    Usage (from the repo root): python -m benchmarks.bench_memory [num_videos]
+"""
+
+import gc
+import json
+import sys
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+from vids_db.models import Video  # type: ignore
+
+from vids_db_server.compact import VideoStore
+
+NUM_CHANNELS = 100
+
+
+def make_rows(count: int) -> List[str]:
+    """Generates stored video json rows with realistic field sizes."""
+    now = datetime.now(timezone.utc)
+    out = []
+    for i in range(count):
+        channel = f"channel_{i % NUM_CHANNELS}"
+        out.append(
+            json.dumps(
+                {
+                    "channel_name": channel,
+                    "title": f"Some video title number {i} about something",
+                    "date_published": (now - timedelta(minutes=i)).isoformat(),
+                    "date_lastupdated": now.isoformat(),
+                    "channel_url": f"https://rumble.com/c/{channel}",
+                    "source": "rumble.com",
+                    "url": f"https://rumble.com/v{i}-some-video-title.html",
+                    "duration": i % 3600,
+                    "description": "A description of the video. " * 4,
+                    "img_src": f"https://sp.rmbl.ws/s8/1/{i}/thumb.jpg",
+                    "iframe_src": f"https://rumble.com/embed/v{i}/",
+                    "views": i * 7,
+                }
+            )
+        )
+    return out
+
+
+def measure(build: Callable[[List[str]], Any], rows: List[str]) -> float:
+    """Returns the bytes per video still held after build(rows)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build(rows)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / len(rows)
+
+
+def as_videos(rows: List[str]) -> Dict[str, Video]:
+    """Holds the full models."""
+    vids = (Video(**json.loads(row)) for row in rows)
+    return {vid.url: vid for vid in vids}
+
+
+def as_tuples(rows: List[str]) -> Dict[str, Tuple[str, float, int]]:
+    """Holds (channel, published, views) tuples."""
+    out = {}
+    for row in rows:
+        vid = json.loads(row)
+        published = datetime.fromisoformat(vid["date_published"]).timestamp()
+        out[vid["url"]] = (vid["channel_name"], published, vid["views"])
+    return out
+
+
+def as_store(rows: List[str]) -> VideoStore:
+    """Holds the same records in the compact store."""
+    store = VideoStore()
+    for row in rows:
+        vid = json.loads(row)
+        published = datetime.fromisoformat(vid["date_published"]).timestamp()
+        store.put(vid["url"], vid["channel_name"], published, vid["views"])
+    return store
+
+
+def main() -> None:
+    """Prints the bytes per cached video of each representation."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rows = make_rows(count)
+    print(f"videos: {count}")
+    print(f"pydantic Video: {measure(as_videos, rows):8.0f} bytes/video")
+    print(f"dict of tuples: {measure(as_tuples, rows):8.0f} bytes/video")
+    print(f"VideoStore:     {measure(as_store, rows):8.0f} bytes/video")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,4 +6,6 @@ if [ -f "./activate.sh" ]; then
 fi
 
 python -m webbrowser -t "http://127.0.0.1:80"
-uvicorn vids_db_server.app:app --no-use-colors --reload --port 80 --host 0.0.0.0 --workers 10
+# Read by uvicorn as the number of workers and by the app to size its pools.
+export WEB_CONCURRENCY=${WEB_CONCURRENCY:-10}
+uvicorn vids_db_server.app:app --no-use-colors --reload --port 80 --host 0.0.0.0 --workers $WEB_CONCURRENCY
@@ -5,4 +5,6 @@ if [ -f "./activate.sh" ]; then
   source ./activate.sh
 fi
 
-uvicorn vids_db_server.app:app --no-use-colors --reload --port 80 --host 0.0.0.0 --workers 10
+# Read by uvicorn as the number of workers and by the app to size its pools.
+export WEB_CONCURRENCY=${WEB_CONCURRENCY:-10}
+uvicorn vids_db_server.app:app --no-use-colors --reload --port 80 --host 0.0.0.0 --workers $WEB_CONCURRENCY
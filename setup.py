@@ -115,6 +115,7 @@ setup(
     entry_points={
         "console_scripts": [
             "vids_db_server = vids_db_server.cmd:main",
+            "vids_db_ingest = vids_db_server.cmd:ingest_main",
         ],
     },
     packages=find_packages(exclude=["tests", "*.tests", "*.tests.*", "tests.*"]),
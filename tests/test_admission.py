@@ -0,0 +1,147 @@
+"""
+Tests the admission control middleware.
+"""
+
+import asyncio
+import unittest
+from typing import Any, Dict, List
+
+from vids_db_server.admission import (
+    READ,
+    SEARCH,
+    WRITE,
+    AdmissionController,
+    AdmissionMiddleware,
+    RouteClassLimit,
+    TokenBucket,
+    classify,
+)
+
+
+def make_controller(concurrency: int, max_waiting: int, rate: float) -> AdmissionController:
+    """Generates a controller with the same limits for every class."""
+    limits = {
+        name: RouteClassLimit(name, concurrency, max_waiting, rate, burst=1)
+        for name in (READ, SEARCH, WRITE)
+    }
+    return AdmissionController(limits, queue_timeout=0.05)
+
+
+async def call(
+    app: Any, method: str, path: str, api_key: str = "", client: str = "1.2.3.4"
+) -> Dict[str, Any]:
+    """Calls the asgi app and returns the response start message."""
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "headers": [(b"api-key", api_key.encode())] if api_key else [],
+        "client": (client, 1),
+    }
+    messages: List[Dict[str, Any]] = []
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": b""}
+
+    async def send(message: Dict[str, Any]) -> None:
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]
+
+
+class AdmissionTester(unittest.TestCase):
+    """Tests the functionality of the admission control."""
+
+    def test_classify(self) -> None:
+        """Routes map to the expected classes."""
+        self.assertEqual(WRITE, classify("PUT", "/put/videos"))
+        self.assertEqual(WRITE, classify("DELETE", "/delete/channel"))
+        self.assertEqual(SEARCH, classify("POST", "/json/many"))
+        self.assertEqual(SEARCH, classify("GET", "/search"))
+        self.assertEqual(READ, classify("GET", "/rss"))
+
+    def test_token_bucket(self) -> None:
+        """The bucket allows a burst and then asks the client to wait."""
+        bucket = TokenBucket(rate=2.0, burst=2.0)
+        now = bucket.updated_at
+        self.assertEqual(0.0, bucket.take(now))
+        self.assertEqual(0.0, bucket.take(now))
+        self.assertAlmostEqual(0.5, bucket.take(now))
+        self.assertEqual(0.0, bucket.take(now + 0.5))
+
+    def test_rate_limited(self) -> None:
+        """A client over its rate gets a 429 with Retry-After."""
+
+        async def ok_app(_scope: Any, _receive: Any, send: Any) -> None:
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+
+        app = AdmissionMiddleware(ok_app, make_controller(4, 4, rate=0.5))
+
+        async def run() -> List[Dict[str, Any]]:
+            return [await call(app, "GET", "/rss"), await call(app, "GET", "/rss")]
+
+        first, second = asyncio.run(run())
+        self.assertEqual(200, first["status"])
+        self.assertEqual(429, second["status"])
+        self.assertIn((b"retry-after", b"2"), second["headers"])
+
+    def test_rate_keyed_by_valid_api_key_only(self) -> None:
+        """Made up api keys share the ip bucket, the real key has its own."""
+
+        async def ok_app(_scope: Any, _receive: Any, send: Any) -> None:
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+
+        controller = make_controller(4, 4, rate=0.5)
+        controller.is_known_key = lambda key: key == "secret"
+        app = AdmissionMiddleware(ok_app, controller)
+
+        async def run() -> List[int]:
+            out = []
+            for key in ["fake1", "fake2", "fake3", "secret", "secret"]:
+                out.append((await call(app, "GET", "/search", key))["status"])
+            return out
+
+        self.assertEqual([200, 429, 429, 200, 429], asyncio.run(run()))
+
+    def test_api_key_holders_limited_per_ip(self) -> None:
+        """Scrapers sharing the api key do not throttle each other."""
+
+        async def ok_app(_scope: Any, _receive: Any, send: Any) -> None:
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+
+        controller = make_controller(4, 4, rate=0.5)
+        controller.is_known_key = lambda key: key == "secret"
+        app = AdmissionMiddleware(ok_app, controller)
+
+        async def run() -> List[int]:
+            out = []
+            for client in ["1.1.1.1", "1.1.1.1", "2.2.2.2"]:
+                msg = await call(app, "GET", "/search", "secret", client=client)
+                out.append(msg["status"])
+            return out
+
+        self.assertEqual([200, 429, 200], asyncio.run(run()))
+
+    def test_overload(self) -> None:
+        """Requests beyond concurrency and the queue bound get a 503."""
+
+        async def slow_app(_scope: Any, _receive: Any, send: Any) -> None:
+            await asyncio.sleep(0.2)
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+
+        controller = make_controller(1, 1, rate=0)
+        app = AdmissionMiddleware(slow_app, controller)
+
+        async def run() -> List[Dict[str, Any]]:
+            return await asyncio.gather(*[call(app, "PUT", "/put/videos") for _ in range(3)])
+
+        statuses = sorted(msg["status"] for msg in asyncio.run(run()))
+        self.assertEqual([200, 503, 503], statuses)
+        self.assertEqual(2, controller.limits[WRITE].rejected_overload)
+        # Reads are in their own class and unaffected.
+        self.assertEqual(0, controller.limits[READ].rejected_overload)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+"""
+Tests the client against a running server.
+"""
+
+# pylint: disable=R0801
+
+import asyncio
+import os
+import threading
+import time
+import unittest
+from typing import Any, Dict, Iterator, List
+
+from vids_db.date import now_local  # type: ignore
+from vids_db.models import Video  # type: ignore
+from vids_db_server.client import (
+    DEFAULT_BATCH_SIZE,
+    AsyncVidsDbClient,
+    PartialUploadError,
+    VidsDbClient,
+    batched,
+)
+from vids_db_server.testing.run_server_in_thread import (  # type: ignore
+    HOST,
+    PORT,
+    run_server_in_thread,
+)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TEST_DB = os.path.join(HERE, "data")
+REMOTE_ENDPOINT = f"http://{HOST}:{PORT}"
+
+os.environ.update({"DB_PATH_DIR": TEST_DB})
+
+
+def make_vid(channel_name: str, title: str) -> Video:
+    """Generates a video with default values."""
+    return Video(
+        channel_name=channel_name,
+        title=title,
+        date_published=now_local(),
+        date_lastupdated=now_local(),
+        channel_url=f"{REMOTE_ENDPOINT}/channel/{channel_name}",
+        source="rumble.com",
+        url=f"{REMOTE_ENDPOINT}/video/{title}",
+        img_src=f"{REMOTE_ENDPOINT}/img/{title}.png",
+        iframe_src=f"{REMOTE_ENDPOINT}/iframe/{title}",
+        views=100,
+        duration=60,
+        description="",
+    )
+
+
+class ClientTester(unittest.TestCase):
+    """Tester for the vids_db_server client."""
+
+    def test_batch_size_matches_server(self) -> None:
+        """The client never sends more than the server accepts."""
+        from vids_db_server.app import (  # pylint: disable=import-outside-toplevel
+            MAX_BULK_UPDATE_SIZE,
+        )
+
+        self.assertLessEqual(DEFAULT_BATCH_SIZE, MAX_BULK_UPDATE_SIZE)
+        sizes = [len(b) for b in batched([make_vid("chan", "title")] * 5, 2)]
+        self.assertEqual([2, 2, 1], sizes)
+
+    def test_put_videos(self) -> None:
+        """Uploads gzipped batches with both clients and reads them back."""
+        vids = [make_vid("client_channel", f"client_title{i}") for i in range(25)]
+        with run_server_in_thread():
+            with VidsDbClient(REMOTE_ENDPOINT, batch_size=10, gzip_requests=True) as client:
+                self.assertEqual(20, client.put_videos(vids[:20]))
+                self.assertIn("client_channel", client.channels())
+
+            async def run() -> int:
+                async with AsyncVidsDbClient(REMOTE_ENDPOINT, batch_size=2) as aclient:
+                    return await aclient.put_videos(vids[20:])
+
+            self.assertEqual(5, asyncio.run(run()))
+            with VidsDbClient(REMOTE_ENDPOINT) as client:
+                feed = client.json_feed("client_channel")
+                self.assertEqual(25, len(feed))
+
+    def check_partial_upload(self, use_async: bool) -> None:
+        """Batches are taken as uploads finish and a failure reports the count."""
+        lock = threading.Lock()
+        taken: List[int] = []
+        state = {"inflight": 0, "max_inflight": 0, "stored": 0}
+
+        def videos() -> Iterator[Video]:
+            for i in range(40):
+                taken.append(i)
+                yield make_vid("chan", f"title{i}")
+
+        def put_batch(batch: List[Dict[str, Any]]) -> int:
+            with lock:
+                state["inflight"] += 1
+                state["max_inflight"] = max(state["max_inflight"], state["inflight"])
+            time.sleep(0.02)
+            with lock:
+                state["inflight"] -= 1
+                if batch[0]["title"] == "title4":
+                    raise ConnectionError("boom")
+                state["stored"] += len(batch)
+            return len(batch)
+
+        with self.assertRaises(PartialUploadError) as ctx:
+            if use_async:
+
+                async def run() -> int:
+                    async with AsyncVidsDbClient(
+                        REMOTE_ENDPOINT, batch_size=2, max_parallel=2
+                    ) as aclient:
+                        aclient.client.put_batch = put_batch  # type: ignore
+                        return await aclient.put_videos(videos())
+
+                asyncio.run(run())
+            else:
+                with VidsDbClient(REMOTE_ENDPOINT, batch_size=2, max_parallel=2) as client:
+                    client.put_batch = put_batch  # type: ignore
+                    client.put_videos(videos())
+        self.assertEqual(state["stored"], ctx.exception.uploaded)
+        self.assertGreaterEqual(ctx.exception.uploaded, 4)
+        self.assertIsInstance(ctx.exception.__cause__, ConnectionError)
+        self.assertLessEqual(state["max_inflight"], 2)
+        # No batches are taken from the input after the failure.
+        self.assertLess(len(taken), 40)
+
+    def test_async_put_videos_cancelled(self) -> None:
+        """Cancelling the caller cancels the batches in flight."""
+
+        def put_batch(batch: List[Dict[str, Any]]) -> int:
+            time.sleep(0.05)
+            return len(batch)
+
+        async def run() -> int:
+            async with AsyncVidsDbClient(REMOTE_ENDPOINT, batch_size=2, max_parallel=2) as aclient:
+                aclient.client.put_batch = put_batch  # type: ignore
+                upload = asyncio.ensure_future(
+                    aclient.put_videos(make_vid("chan", f"title{i}") for i in range(20))
+                )
+                await asyncio.sleep(0.01)
+                upload.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await upload
+                # No batch task is left running unowned.
+                return len(asyncio.all_tasks()) - 1
+
+        self.assertEqual(0, asyncio.run(run()))
+
+    def test_put_videos_partial_failure(self) -> None:
+        """The sync client bounds its window and reports partial success."""
+        self.check_partial_upload(use_async=False)
+
+    def test_async_put_videos_partial_failure(self) -> None:
+        """The async client bounds its window and reports partial success."""
+        self.check_partial_upload(use_async=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+"""
+Tests the compact video store.
+"""
+
+import unittest
+
+from vids_db_server.compact import VideoStore
+
+
+class CompactTester(unittest.TestCase):
+    """Tests the functionality of the compact store."""
+
+    def test_upsert_and_remove(self) -> None:
+        """Re-puts replace the record and removed slots are reused."""
+        store = VideoStore()
+        store.put("u1", "chan_a", 1.5, 10)
+        store.put("u2", "chan_b", 2.5, 20)
+        store.put("u1", "chan_a", 3.5, 30)
+        self.assertEqual(2, len(store))
+        self.assertEqual(("chan_a", 3.5, 30), store.get("u1"))
+        self.assertEqual(("chan_b", 2.5, 20), store.pop("u2"))
+        self.assertIsNone(store.get("u2"))
+        self.assertNotIn("u2", store)
+        store.put("u3", "chan_b", 4.5, 40)
+        self.assertEqual(2, len(store.views))  # The slot of u2 is reused.
+        self.assertEqual(("chan_b", 4.5, 40), store.get("u3"))
+        self.assertEqual(["u3"], store.urls_of_channel("chan_b"))
+        self.assertEqual([], store.urls_of_channel("missing"))
+        with self.assertRaises(KeyError):
+            store.pop("u2")
+        store.clear()
+        self.assertEqual(0, len(store))
+
+
+if __name__ == "__main__":
+    unittest.main()
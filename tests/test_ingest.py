@@ -0,0 +1,73 @@
+"""
+Tests the parallel rss ingestion.
+"""
+
+# pylint: disable=R0801
+
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from vids_db.date import now_local  # type: ignore
+from vids_db.models import Video  # type: ignore
+from vids_db_server.ingest import ingest_feeds, make_pool
+from vids_db_server.rss import to_rss
+
+URL = "http://localhost"
+
+
+def make_vid(channel_name: str, title: str) -> Video:
+    """Generates a video with default values."""
+    return Video(
+        channel_name=channel_name,
+        title=title,
+        date_published=now_local(),
+        date_lastupdated=now_local(),
+        channel_url=f"{URL}/channel/{channel_name}",
+        source="rumble.com",
+        url=f"{URL}/video/{title}",
+        img_src=f"{URL}/img/{title}.png",
+        iframe_src=f"{URL}/iframe/{title}",
+        views=100,
+        duration=60,
+        description="test description",
+    )
+
+
+class IngestTester(unittest.TestCase):
+    """Tests the functionality of the ingestion pipeline."""
+
+    def test_ingest_feeds(self) -> None:
+        """Feeds are parsed in the pool and written by the caller."""
+        feeds = [
+            to_rss(f"chan{i}", [make_vid(f"chan{i}", f"title{i}_{j}") for j in range(3)])
+            for i in range(4)
+        ]
+        feeds.insert(2, "<rss><channel><item><title>broken</title></item></channel></rss>")
+        written: List[Video] = []
+        report = ingest_feeds(feeds, written.extend)
+        self.assertEqual(5, report.feeds)
+        self.assertEqual(12, report.videos)
+        self.assertEqual(12, len(written))
+        self.assertEqual(1, len(report.errors))
+        self.assertEqual(2, report.errors[0]["feed"])
+
+    def test_ingest_feeds_with_pool(self) -> None:
+        """A caller supplied pool is used and left running."""
+        feeds = [to_rss("chan", [make_vid("chan", "title")])]
+        written: List[Video] = []
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            report = ingest_feeds(feeds, written.extend, pool)
+            self.assertEqual(1, report.videos)
+            self.assertEqual(1, pool.submit(lambda: 1).result())
+        self.assertGreater(report.to_json()["feeds_per_sec"], 0)
+
+    def test_pool_does_not_fork(self) -> None:
+        """The workers do not inherit the parent process state."""
+        with make_pool(1) as pool:
+            method = pool._mp_context.get_start_method()  # type: ignore  # pylint: disable=protected-access
+        self.assertIn(method, ("forkserver", "spawn"))
+
+
+if __name__ == "__main__":
+    unittest.main()
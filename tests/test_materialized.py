@@ -0,0 +1,99 @@
+"""
+Tests the materialized per-channel feeds.
+"""
+
+import asyncio
+import unittest
+from typing import Dict, List, Optional, Set
+
+from vids_db_server.materialized import MaterializedFeeds
+from vids_db_server.single_flight import SingleFlight
+
+
+class MaterializedTester(unittest.TestCase):
+    """Tests the functionality of the materialized feeds."""
+
+    def setUp(self) -> None:
+        self.versions: Dict[str, int] = {}
+        self.calls: List[str] = []
+
+    def build(self, channel: str) -> bytes:
+        """Fake feed builder, returns the channel's write version."""
+        self.calls.append(channel)
+        return f"{channel}:{self.versions.get(channel, 0)}".encode()
+
+    def make(self, max_channels: int = 10, known: Optional[Set[str]] = None) -> MaterializedFeeds:
+        """Generates the store with the fake builder."""
+        return MaterializedFeeds(
+            {"rss": self.build},
+            SingleFlight(),
+            max_channels=max_channels,
+            debounce=0.01,
+            is_known=None if known is None else known.__contains__,
+        )
+
+    def test_served_from_memory(self) -> None:
+        """Repeated requests are served without rebuilding."""
+        feeds = self.make()
+
+        async def run() -> List[bytes]:
+            return [await feeds.get("chan", "rss") for _ in range(3)]
+
+        self.assertEqual([b"chan:0"] * 3, asyncio.run(run()))
+        self.assertEqual(["chan"], self.calls)
+        self.assertEqual(2, feeds.hits)
+
+    def test_write_rebuilds_debounced(self) -> None:
+        """A burst of writes causes one background rebuild."""
+        feeds = self.make()
+
+        async def run() -> bytes:
+            await feeds.get("chan", "rss")
+            for _ in range(5):
+                self.versions["chan"] = self.versions.get("chan", 0) + 1
+                feeds.mark_dirty(["chan", "cold_channel"])
+            await asyncio.sleep(0.2)
+            return await feeds.get("chan", "rss")
+
+        self.assertEqual(b"chan:5", asyncio.run(run()))
+        self.assertEqual(["chan", "chan"], self.calls)
+
+    def test_lru_bound(self) -> None:
+        """Only max_channels channels are kept."""
+        feeds = self.make(max_channels=2)
+
+        async def run() -> None:
+            for channel in ["a", "b", "c"]:
+                await feeds.get(channel, "rss")
+
+        asyncio.run(run())
+        self.assertEqual([("b", ["rss"]), ("c", ["rss"])], feeds.hot_channels())
+
+    def test_unknown_channels_not_materialized(self) -> None:
+        """Names that are not known channels do not take an entry."""
+        feeds = self.make(known={"chan"})
+
+        async def run() -> List[bytes]:
+            return [await feeds.get(name, "rss") for name in ["junk", "junk", "chan"]]
+
+        self.assertEqual([b"junk:0", b"junk:0", b"chan:0"], asyncio.run(run()))
+        self.assertEqual([("chan", ["rss"])], feeds.hot_channels())
+
+    def test_prewarm_skips_malformed(self) -> None:
+        """A malformed warm-start section is skipped instead of raising."""
+        feeds = self.make(known={"chan", "other"})
+
+        async def run() -> None:
+            feeds.prewarm({"not": "a list"})
+            feeds.prewarm(
+                [["chan", ["rss"]], "junk", ["other"], ["other", "rss"], ["gone", ["rss"]]]
+            )
+            await asyncio.sleep(0.1)
+
+        asyncio.run(run())
+        self.assertEqual([("chan", ["rss"])], feeds.hot_channels())
+        self.assertEqual(["chan"], self.calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
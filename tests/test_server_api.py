@@ -4,13 +4,16 @@ Tests the fastapi server.
 
 # pylint: disable=invalid-name,R0801
 
+import asyncio
 import os
 import shutil
 import unittest
+from typing import List
 
 import requests  # type: ignore
 from vids_db.date import now_local  # type: ignore
 from vids_db.models import Video  # type: ignore
+from vids_db_server.rss import to_rss
 from vids_db_server.testing.run_server_in_thread import (  # type: ignore
     HOST,
     PORT,
@@ -92,6 +95,83 @@ class ApiServerTester(unittest.TestCase):
             )
             response.raise_for_status()
 
+    def test_put_rss_many(self) -> None:
+        """Feeds are ingested, too many feeds are rejected."""
+        feeds = [to_rss("rss_many", [make_vid("rss_many", "rss_many_title")])]
+        with run_server_in_thread():
+            response = requests.put(f"{REMOTE_ENDPOINT}/put/rss/many", json=feeds, timeout=60)
+            response.raise_for_status()
+            self.assertEqual(1, response.json()["videos"])
+            response = requests.put(
+                f"{REMOTE_ENDPOINT}/put/rss/many", json=feeds * 1000, timeout=60
+            )
+            self.assertEqual(413, response.status_code)
+
+    def test_broken_ingest_pool_is_replaced(self) -> None:
+        """A pool whose worker died is replaced and the feeds retried."""
+        from vids_db_server import app  # pylint: disable=import-outside-toplevel
+
+        pool = app.get_ingest_pool()
+        pool.submit(int).result()
+        for process in list(pool._processes.values()):  # pylint: disable=protected-access
+            process.kill()
+            process.join()
+        written: List[Video] = []
+        feeds = [to_rss("broken_pool", [make_vid("broken_pool", "broken_pool_title")])]
+        try:
+            report = app._ingest_rss(feeds, written.extend)  # pylint: disable=protected-access
+            self.assertEqual(1, report.videos)
+            self.assertIsNot(pool, app.get_ingest_pool())
+        finally:
+            app._shutdown_ingest_pool()  # pylint: disable=protected-access
+
+    def test_warm_start_channels_refreshed(self) -> None:
+        """A stale warm-start channel list is replaced by the db names."""
+        from vids_db_server import app  # pylint: disable=import-outside-toplevel
+
+        app.get_db().update_many([make_vid("refreshed_channel", "refreshed_title")])
+        app.channel_cache.set(["stale_channel"])
+        asyncio.run(app._refresh_channels())  # pylint: disable=protected-access
+        self.assertTrue(app.channel_cache.has("refreshed_channel"))
+        self.assertFalse(app.channel_cache.has("stale_channel"))
+
+    def test_channels_written_elsewhere_become_known(self) -> None:
+        """The background refresh picks up channels written by other processes."""
+        from vids_db_server import app  # pylint: disable=import-outside-toplevel
+
+        # Written straight to the db, as the cli or another worker would.
+        app.get_db().update_many([make_vid("elsewhere_channel", "elsewhere_title")])
+
+        async def run() -> bool:
+            task = asyncio.ensure_future(app._refresh_channels_forever(0))  # pylint: disable=protected-access
+            for _ in range(100):
+                if app.channel_cache.has("elsewhere_channel"):
+                    break
+                await asyncio.sleep(0.01)
+            task.cancel()
+            return app.channel_cache.has("elsewhere_channel")
+
+        self.assertTrue(asyncio.run(run()))
+
+    def test_json_many_normalizes_channels(self) -> None:
+        """Reordered and repeated channel names return the same feed."""
+        vids = [make_vid("many_a", "many_a_title"), make_vid("many_b", "many_b_title")]
+        with run_server_in_thread():
+            requests.put(
+                f"{REMOTE_ENDPOINT}/put/videos", json=[v.to_json() for v in vids], timeout=30
+            ).raise_for_status()
+            feeds = []
+            for names in (["many_a", "many_b"], ["many_b", "many_a", "many_a"]):
+                response = requests.post(
+                    f"{REMOTE_ENDPOINT}/json/many",
+                    json={"channel_names": names, "hours_ago": 24},
+                    timeout=30,
+                )
+                response.raise_for_status()
+                feeds.append(response.json())
+        self.assertEqual(2, len(feeds[0]))
+        self.assertEqual(feeds[0], feeds[1])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,131 @@
+"""
+Tests request coalescing.
+"""
+
+import asyncio
+import threading
+import time
+import unittest
+from typing import Callable, List
+
+from vids_db_server.single_flight import SingleFlight
+
+
+class SingleFlightTester(unittest.TestCase):
+    """Tests the functionality of the single-flight layer."""
+
+    def test_concurrent_requests_share_one_call(self) -> None:
+        """Identical concurrent requests run the work once."""
+        calls: List[int] = []
+        lock = threading.Lock()
+
+        def work() -> bytes:
+            with lock:
+                calls.append(1)
+            time.sleep(0.1)
+            return b"result"
+
+        flight = SingleFlight(window=0.0)
+
+        async def run() -> List[bytes]:
+            return await asyncio.gather(*[flight.do("key", work) for _ in range(10)])
+
+        results = asyncio.run(run())
+        self.assertEqual([b"result"] * 10, results)
+        self.assertEqual(1, len(calls))
+        self.assertEqual(9, flight.joined)
+
+    def test_window_and_invalidate(self) -> None:
+        """Later arrivals join within the window until invalidated."""
+        calls: List[int] = []
+
+        def work() -> bytes:
+            calls.append(1)
+            return str(len(calls)).encode()
+
+        flight = SingleFlight(window=60.0)
+
+        async def run() -> List[bytes]:
+            out = [await flight.do("key", work), await flight.do("key", work)]
+            flight.invalidate()
+            out.append(await flight.do("key", work))
+            return out
+
+        self.assertEqual([b"1", b"1", b"2"], asyncio.run(run()))
+
+    def test_invalidate_is_channel_scoped(self) -> None:
+        """A write drops the keys of its channels and the cross-channel keys."""
+        calls: List[str] = []
+
+        def work(name: str) -> Callable[[], bytes]:
+            def run() -> bytes:
+                calls.append(name)
+                return name.encode()
+
+            return run
+
+        flight = SingleFlight(window=60.0)
+        keys = [("rss", "a"), ("json", "b", 30, 100), ("rss/all", 24), ("json/many", 24, ("b",))]
+
+        async def run() -> None:
+            for key in keys:
+                await flight.do(key, work(str(key)))
+            flight.invalidate(["a"])
+            for key in keys:
+                await flight.do(key, work(str(key)))
+
+        asyncio.run(run())
+        self.assertEqual(2, calls.count(str(("rss", "a"))))
+        self.assertEqual(1, calls.count(str(("json", "b", 30, 100))))
+        self.assertEqual(2, calls.count(str(("rss/all", 24))))
+        self.assertEqual(2, calls.count(str(("json/many", 24, ("b",)))))
+
+    def test_unrelated_inflight_stays_joinable(self) -> None:
+        """Work in flight for another channel is still shared after a write."""
+        calls: List[int] = []
+
+        def work() -> bytes:
+            calls.append(1)
+            time.sleep(0.1)
+            return b"b"
+
+        flight = SingleFlight(window=0.0)
+
+        async def run() -> List[bytes]:
+            first = asyncio.ensure_future(flight.do(("rss", "b"), work))
+            await asyncio.sleep(0.01)
+            flight.invalidate(["a"])
+            return list(await asyncio.gather(first, flight.do(("rss", "b"), work)))
+
+        self.assertEqual([b"b", b"b"], asyncio.run(run()))
+        self.assertEqual(1, len(calls))
+
+    def test_expired_results_are_evicted(self) -> None:
+        """An expired result is removed when it is next looked up."""
+        flight = SingleFlight(window=0.01)
+
+        async def run() -> None:
+            await flight.do("key", lambda: b"1")
+            await asyncio.sleep(0.02)
+            self.assertEqual(b"2", await flight.do("key", lambda: b"2"))
+
+        asyncio.run(run())
+        self.assertEqual(b"2", flight._recent["key"][1])  # pylint: disable=protected-access
+
+    def test_errors_are_not_cached(self) -> None:
+        """A failing computation is raised to every waiter and not kept."""
+        flight = SingleFlight(window=60.0)
+
+        def fail() -> bytes:
+            raise ValueError("boom")
+
+        async def run() -> None:
+            with self.assertRaises(ValueError):
+                await flight.do("key", fail)
+            self.assertEqual(b"ok", await flight.do("key", lambda: b"ok"))
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
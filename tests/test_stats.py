@@ -0,0 +1,145 @@
+"""
+Tests the incrementally maintained video statistics.
+"""
+
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from vids_db.database import Database  # type: ignore
+from vids_db.models import Video  # type: ignore
+from vids_db_server.stats import DAY_SECS, VideoStats, read_recent
+
+NOW = datetime(2022, 5, 13, 12, 0, tzinfo=timezone.utc).timestamp()
+
+
+def make_vid(channel: str, url: str, hours_ago: float, views: int) -> Dict[str, Any]:
+    """Generates video json with the fields used by the stats."""
+    published = datetime.fromtimestamp(NOW - hours_ago * 60 * 60, timezone.utc)
+    return {
+        "url": url,
+        "channel_name": channel,
+        "source": "rumble.com" if channel != "chan_b" else "bitchute.com",
+        "date_published": published.isoformat(),
+        "date_lastupdated": published.isoformat(),
+        "views": views,
+    }
+
+
+class StatsTester(unittest.TestCase):
+    """Tests the functionality of the video statistics."""
+
+    def test_incremental_updates(self) -> None:
+        """Re-puts update the views instead of double counting."""
+        stats = VideoStats(retention_days=7)
+        stats.record(
+            [
+                make_vid("chan_a", "u1", 1, 100),
+                make_vid("chan_a", "u2", 13, 50),
+                make_vid("chan_b", "u3", 2, 120),
+                make_vid("chan_b", "u4", 30, 1000),  # Older than 24h.
+            ],
+            now=NOW,
+        )
+        stats.record([make_vid("chan_a", "u1", 1, 500)], now=NOW)
+        self.assertEqual(
+            [{"channel_name": "chan_a", "views": 550}, {"channel_name": "chan_b", "views": 120}],
+            stats.top_channels_by_views(now=NOW),
+        )
+        self.assertEqual(
+            {"chan_a": {"2022-05-13": 1, "2022-05-12": 1}},
+            stats.videos_per_channel_per_day("chan_a"),
+        )
+        self.assertEqual(
+            {"rumble.com": {"last_hour": 3, "last_24h": 3}},
+            {k: v for k, v in stats.ingest_rate_by_source(now=NOW).items() if k == "rumble.com"},
+        )
+        # As time passes videos leave the 24h window.
+        later = NOW + 12 * 60 * 60
+        self.assertEqual(
+            [{"channel_name": "chan_a", "views": 500}, {"channel_name": "chan_b", "views": 120}],
+            stats.top_channels_by_views(now=later),
+        )
+        self.assertEqual({}, stats.ingest_rate_by_source(now=NOW + DAY_SECS + 1))
+
+    def test_reconcile_and_delete(self) -> None:
+        """Reconcile rebuilds from the db and deletes remove channels."""
+        stats = VideoStats(retention_days=1)
+        stats.record([make_vid("chan_a", "u1", 1, 100)], now=NOW)
+        rows = [
+            ("u5", "chan_c", "rumble.com", NOW - 60 * 60, 7, NOW - 60 * 60),
+            ("u6", "chan_c", "rumble.com", NOW - 48 * 60 * 60, 7, NOW - 60),
+        ]
+        stats.reconcile(lambda: rows, now=NOW)
+        self.assertEqual({"chan_c": {"2022-05-13": 1}}, stats.videos_per_channel_per_day())
+        # The ingest rates are rebuilt from the last update of every row.
+        self.assertEqual(
+            {"rumble.com": {"last_hour": 1, "last_24h": 2}}, stats.ingest_rate_by_source(now=NOW)
+        )
+        stats.discard_channel("chan_c")
+        self.assertEqual({}, stats.videos_per_channel_per_day())
+        self.assertEqual([], stats.top_channels_by_views(now=NOW))
+
+    def test_reput_does_not_grow_heap(self) -> None:
+        """Re-puts of a video with an unchanged date add no heap entries."""
+        stats = VideoStats()
+        for views in range(100):
+            stats.record([make_vid("chan_a", "u1", 1, views)], now=NOW)
+        self.assertEqual(1, len(stats._heap_24h))  # pylint: disable=protected-access
+        self.assertEqual(
+            [{"channel_name": "chan_a", "views": 99}], stats.top_channels_by_views(now=NOW)
+        )
+
+    def test_read_recent(self) -> None:
+        """The stats rows are read from the database without the video models."""
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(tmp)
+            vids = [
+                make_vid("chan_a", "http://a/1", 1, 10),
+                make_vid("chan_a", "http://a/2", 72, 5),
+            ]
+            db.update_many(
+                [
+                    Video(
+                        **vid,
+                        title="title",
+                        channel_url="http://a",
+                        duration=60,
+                        description="",
+                        img_src="http://a/img.png",
+                        iframe_src="http://a/iframe",
+                    )
+                    for vid in vids
+                ]
+            )
+            rows = read_recent(db, NOW - DAY_SECS)
+        self.assertEqual(
+            [("http://a/1", "chan_a", "rumble.com", NOW - 60 * 60, 10, NOW - 60 * 60)], rows
+        )
+
+    def test_record_during_reconcile_is_kept(self) -> None:
+        """Videos recorded while the rows are read survive the rebuild."""
+        stats = VideoStats()
+        stored = [("u1", "chan_a", "rumble.com", NOW - 60 * 60, 10, NOW - 60 * 60)]
+
+        def read() -> List[Any]:
+            # A put commits and records after the snapshot was taken.
+            stats.record([make_vid("chan_b", "u2", 1, 20)], now=NOW)
+            return stored
+
+        stats.reconcile(read, now=NOW)
+        self.assertEqual(
+            [{"channel_name": "chan_b", "views": 20}, {"channel_name": "chan_a", "views": 10}],
+            stats.top_channels_by_views(now=NOW),
+        )
+        rates = stats.ingest_rate_by_source(now=NOW)
+        self.assertEqual(1, rates["rumble.com"]["last_24h"])
+        self.assertEqual(1, rates["bitchute.com"]["last_hour"])
+        # Recording after the reconcile no longer buffers.
+        stats.record([make_vid("chan_b", "u3", 1, 20)], now=NOW)
+        self.assertIsNone(stats._pending)  # pylint: disable=protected-access
+
+
+if __name__ == "__main__":
+    unittest.main()
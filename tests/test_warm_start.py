@@ -0,0 +1,40 @@
+"""
+Tests the warm-start cache file.
+"""
+
+import os
+import tempfile
+import unittest
+
+from vids_db_server.warm_start import load_warm_start, save_warm_start
+
+
+class WarmStartTester(unittest.TestCase):
+    """Tests saving and loading of the warm-start file."""
+
+    def test_round_trip(self) -> None:
+        """Sections written to the file are read back unchanged."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "warm_start.bin")
+            sections = {"channels": ["a", "b", "ünïcode"], "other": {"x": 1}}
+            save_warm_start(path, sections)
+            self.assertEqual(sections, load_warm_start(path))
+            self.assertEqual({"other": {"x": 1}}, load_warm_start(path, ["other", "missing"]))
+
+    def test_missing_or_corrupt(self) -> None:
+        """Missing or corrupt files load as None."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "warm_start.bin")
+            self.assertIsNone(load_warm_start(path))
+            with open(path, mode="wb") as fd:
+                fd.write(b"not a warm start file")
+            self.assertIsNone(load_warm_start(path))
+            # A valid header with an index entry of the wrong shape.
+            with open(path, mode="wb") as fd:
+                index = b'{"channels": 5}'
+                fd.write(b"VDBWARM1" + len(index).to_bytes(8, "little") + index)
+            self.assertIsNone(load_warm_start(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
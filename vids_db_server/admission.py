@@ -0,0 +1,261 @@
+"""
+    Admission control for the server: per route class concurrency limits and
+    per client token-bucket rate limits.
+
+    Requests are split into three classes so that scraper bursts against the
+    write and search routes can not starve the cheap feed reads:
+        read   - everything else (feeds, info)
+        search - /search, /json/many, /json/from_urls
+        write  - PUT and DELETE requests
+    A request that would exceed its client's rate gets a 429, a request that
+    can not get a concurrency slot within the queue bound gets a 503. Both
+    carry a Retry-After header.
+
+    Clients are told apart by their ip, and holders of the api key by (key,
+    ip), since every scraper shares the one API_KEY. Behind a reverse proxy
+    uvicorn must run with --proxy-headers --forwarded-allow-ips=<proxy ip>,
+    otherwise every request comes from the proxy ip and the search rate
+    becomes one limit shared by all the clients.
+"""
+
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+READ = "read"
+SEARCH = "search"
+WRITE = "write"
+ROUTE_CLASSES = (READ, SEARCH, WRITE)
+
+SEARCH_PATHS = ("/search", "/json/many", "/json/from_urls")
+
+# Default (concurrency, max waiting, rate per second, burst). A rate of 0
+# disables rate limiting for the class.
+_DEFAULTS: Dict[str, Tuple[int, int, float, float]] = {
+    READ: (64, 256, 0.0, 0.0),
+    SEARCH: (8, 16, 10.0, 20.0),
+    WRITE: (4, 16, 20.0, 40.0),
+}
+
+MAX_TRACKED_CLIENTS = 10000
+
+
+def classify(method: str, path: str) -> str:
+    """Returns the route class of a request."""
+    if method in ("PUT", "DELETE"):
+        return WRITE
+    if path in SEARCH_PATHS:
+        return SEARCH
+    return READ
+
+
+class TokenBucket:  # pylint: disable=too-few-public-methods
+    """Classic token bucket, refilled lazily on each take."""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def take(self, now: Optional[float] = None) -> float:
+        """
+        Takes a token. Returns 0 on success, otherwise the number of seconds
+        until a token will be available.
+        """
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+
+class RouteClassLimit:  # pylint: disable=too-many-instance-attributes
+    """Concurrency and rate limits for one route class."""
+
+    def __init__(
+        self, name: str, concurrency: int, max_waiting: int, rate: float, burst: float
+    ) -> None:
+        self.name = name
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected_rate = 0
+        self.rejected_overload = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._buckets_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str) -> "RouteClassLimit":
+        """
+        Creates the limit from the ADMISSION_<CLASS>_CONCURRENCY,
+        ADMISSION_<CLASS>_MAX_WAITING, RATE_LIMIT_<CLASS>_RPS and
+        RATE_LIMIT_<CLASS>_BURST environment variables.
+        """
+        concurrency, max_waiting, rate, burst = _DEFAULTS[name]
+        prefix = name.upper()
+        env = os.environ.get
+        return cls(
+            name,
+            concurrency=int(env(f"ADMISSION_{prefix}_CONCURRENCY", concurrency)),
+            max_waiting=int(env(f"ADMISSION_{prefix}_MAX_WAITING", max_waiting)),
+            rate=float(env(f"RATE_LIMIT_{prefix}_RPS", rate)),
+            burst=float(env(f"RATE_LIMIT_{prefix}_BURST", burst)),
+        )
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """Created lazily so that it binds to the server's event loop."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    def check_rate(self, client_key: str) -> float:
+        """Returns 0 if the client may proceed, else seconds to retry after."""
+        if self.rate <= 0:
+            return 0.0
+        with self._buckets_lock:
+            bucket = self._buckets.get(client_key)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[client_key] = bucket
+                if len(self._buckets) > MAX_TRACKED_CLIENTS:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client_key)
+            return bucket.take()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the current counters for this class."""
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected_rate": self.rejected_rate,
+            "rejected_overload": self.rejected_overload,
+        }
+
+
+class AdmissionController:  # pylint: disable=too-few-public-methods
+    """Holds the limits of all the route classes."""
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, RouteClassLimit]] = None,
+        queue_timeout: Optional[float] = None,
+        is_known_key: Optional[Callable[[str], bool]] = None,
+    ) -> None:
+        self.limits = limits or {
+            name: RouteClassLimit.from_env(name) for name in ROUTE_CLASSES
+        }
+        if queue_timeout is None:
+            queue_timeout = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "2.0"))
+        self.queue_timeout = queue_timeout
+        # Only api keys accepted by this get their own rate bucket per ip,
+        # anything else is limited by client ip so that made up keys can't
+        # reset it.
+        self.is_known_key = is_known_key
+
+    def client_key(self, scope: Scope) -> str:
+        """Returns the rate-limit bucket key of a request."""
+        client = scope.get("client")
+        ip_key = "ip:" + (client[0] if client else "unknown")
+        if self.is_known_key is not None:
+            for key, val in scope.get("headers", []):
+                if key == b"api-key" and val:
+                    api_key = val.decode("latin-1")
+                    if self.is_known_key(api_key):
+                        return f"key:{api_key}:{ip_key}"
+                    break
+        return ip_key
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the counters of all the route classes."""
+        return {name: limit.stats() for name, limit in self.limits.items()}
+
+
+async def send_json_error(
+    send: Send, status_code: int, error: str, headers: Optional[List[Tuple[bytes, bytes]]] = None
+) -> None:
+    """Sends a {"ok": False, "error": error} response from asgi middleware."""
+    body = json.dumps({"ok": False, "error": error}).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+            ]
+            + (headers or []),
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _reject(send: Send, status_code: int, retry_after: float, error: str) -> None:
+    retry_header = str(max(1, math.ceil(retry_after))).encode("latin-1")
+    await send_json_error(send, status_code, error, [(b"retry-after", retry_header)])
+
+
+class AdmissionMiddleware:  # pylint: disable=too-few-public-methods
+    """Pure ASGI middleware applying an AdmissionController."""
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController) -> None:
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        limit = self.controller.limits[classify(scope["method"], scope["path"])]
+        retry_after = limit.check_rate(self.controller.client_key(scope))
+        if retry_after > 0:
+            limit.rejected_rate += 1
+            await _reject(
+                send, 429, retry_after, f"rate limit exceeded for {limit.name} requests"
+            )
+            return
+        semaphore = limit.semaphore
+        if semaphore.locked():
+            if limit.waiting >= limit.max_waiting:
+                limit.rejected_overload += 1
+                await _reject(
+                    send, 503, 1.0, f"server overloaded with {limit.name} requests"
+                )
+                return
+            limit.waiting += 1
+            try:
+                await asyncio.wait_for(
+                    semaphore.acquire(), self.controller.queue_timeout
+                )
+            except asyncio.TimeoutError:
+                limit.rejected_overload += 1
+                await _reject(
+                    send, 503, 1.0, f"server overloaded with {limit.name} requests"
+                )
+                return
+            finally:
+                limit.waiting -= 1
+        else:
+            await semaphore.acquire()
+        limit.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.in_flight -= 1
+            semaphore.release()
@@ -2,11 +2,17 @@
     Flask app for the ytclip command line tool. Serves an index.html at port 80. Clipping
     api is located at /clip
 """
+import asyncio
+import json
 import os
 import threading
+import time
 import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
 
 from fastapi import FastAPI, Header
 from fastapi.middleware.cors import CORSMiddleware
@@ -14,16 +20,27 @@ from fastapi.responses import JSONResponse, RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import AnyUrl, BaseModel  # pylint: disable=no-name-in-module
 from starlette import status
+from starlette.concurrency import run_in_threadpool
 from vids_db.database import Database  # type: ignore
 from vids_db.date import parse_datetime  # type: ignore
 from vids_db.models import Video  # type: ignore
 
+from vids_db_server.admission import AdmissionController, AdmissionMiddleware
+from vids_db_server.gzip_request import GzipRequestMiddleware
+from vids_db_server.ingest import IngestReport, ingest_feeds, make_pool
+from vids_db_server.materialized import MaterializedFeeds
 from vids_db_server.rss import from_rss, to_rss
+from vids_db_server.single_flight import SingleFlight
+from vids_db_server.stats import VideoStats, read_recent
 
 # from vids_db.database import Database
 from vids_db_server.version import VERSION
+from vids_db_server.warm_start import load_warm_start, save_warm_start
+
+_MODULE_START = time.perf_counter()
 
 MAX_BULK_UPDATE_SIZE = 1000
+MAX_BULK_RSS_FEEDS = 100
 
 MODE = os.environ.get("MODE", "DEVELOPMENT")
 IS_PRODUCTION = MODE == "PRODUCTION"
@@ -31,16 +48,247 @@ HERE = os.path.dirname(os.path.abspath(__file__))
 ROOT = os.path.dirname(HERE)
 
 DB_PATH = os.environ.get("DB_PATH_DIR", os.path.join(ROOT, "data"))
-print(f"{__file__}: DB_PATH={DB_PATH}")
+WARM_START_PATH = os.environ.get(
+    "WARM_START_PATH", os.path.join(DB_PATH, "warm_start.bin")
+)
+# How long the in-memory channel list is trusted before it is re-read from the
+# database. Other workers write to the same database, so this bounds staleness.
+CHANNEL_CACHE_TTL = float(os.environ.get("CHANNEL_CACHE_TTL", "60"))
+# Seconds a finished feed query is shared with identical later requests.
+SINGLE_FLIGHT_WINDOW = float(os.environ.get("SINGLE_FLIGHT_WINDOW", "0.25"))
+# Channels whose default /rss and /json feeds are kept prebuilt in memory. A
+# worker that did not handle a write serves its prebuilt feed for up to the
+# ttl, so default feeds can be that many seconds stale.
+MATERIALIZED_FEED_CHANNELS = int(os.environ.get("MATERIALIZED_FEED_CHANNELS", "1000"))
+MATERIALIZED_FEED_TTL = float(os.environ.get("MATERIALIZED_FEED_TTL", "60"))
+MATERIALIZED_FEED_DEBOUNCE = float(os.environ.get("MATERIALIZED_FEED_DEBOUNCE", "0.5"))
+# Days of videos kept in the /stats aggregates, and how often they are
+# rebuilt from the database.
+STATS_RETENTION_DAYS = int(os.environ.get("STATS_RETENTION_DAYS", "7"))
+STATS_RECONCILE_SECS = float(os.environ.get("STATS_RECONCILE_SECS", "300"))
+# Rss parsing processes per server worker. Every uvicorn worker has its own
+# pool, so by default the cores are split between the WEB_CONCURRENCY workers
+# (set by the Dockerfile and the run scripts) and each pool is kept small.
+INGEST_PROCESSES = int(os.environ.get("INGEST_PROCESSES", "0")) or max(
+    1, min(2, (os.cpu_count() or 1) // int(os.environ.get("WEB_CONCURRENCY", "1")))
+)
+DEFAULT_JSON_DAYS = 30
+DEFAULT_JSON_LIMIT = 100
 
 
 if MODE == "PRODUCTION" and os.environ.get("API_KEY") is None:
     raise Exception("API_KEY environment variable must be set in production mode")
 
-vids_db = Database(DB_PATH)
+_DB: Optional[Database] = None
+_DB_LOCK = threading.Lock()
+_INGEST_POOL: Optional[ProcessPoolExecutor] = None
+
+# Seconds spent in each startup stage, reported on /info.
+STARTUP_TIMINGS: Dict[str, float] = {}
+
+
+def get_db() -> Database:
+    """Returns the database, opening it on first use."""
+    global _DB  # pylint: disable=global-statement
+    if _DB is None:
+        with _DB_LOCK:
+            if _DB is None:
+                start = time.perf_counter()
+                _DB = Database(DB_PATH)
+                STARTUP_TIMINGS["db_open"] = time.perf_counter() - start
+    return _DB
+
+
+def get_ingest_pool() -> ProcessPoolExecutor:
+    """Returns the rss parsing process pool, creating it on first use."""
+    global _INGEST_POOL  # pylint: disable=global-statement
+    with _DB_LOCK:
+        if _INGEST_POOL is None:
+            _INGEST_POOL = make_pool(INGEST_PROCESSES)
+    return _INGEST_POOL
+
+
+def _shutdown_ingest_pool(pool: Optional[ProcessPoolExecutor] = None) -> None:
+    """Shuts down the ingest pool, if pool is given only while it is still current."""
+    global _INGEST_POOL  # pylint: disable=global-statement
+    with _DB_LOCK:
+        if _INGEST_POOL is not None and pool in (None, _INGEST_POOL):
+            _INGEST_POOL.shutdown(wait=False)
+            _INGEST_POOL = None
+
+
+class ChannelCache:
+    """In-memory channel name list, kept current by the put handlers."""
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self.names: Set[str] = set()
+        self.updated_at = 0.0  # monotonic time, 0 means never loaded.
+        self.from_warm_start = False
+        self.lock = threading.Lock()
+        # Names added and removed while refresh() reads the db, else None.
+        self._added: Optional[Set[str]] = None
+        self._removed: Optional[Set[str]] = None
+
+    def set(self, names: List[str]) -> None:
+        """Replaces the channel names."""
+        with self.lock:
+            self.names = set(names)
+            self.updated_at = time.monotonic()
+
+    def add(self, names: List[str]) -> None:
+        """Adds channel names."""
+        with self.lock:
+            self.names.update(names)
+            if self._added is not None and self._removed is not None:
+                self._added.update(names)
+                self._removed.difference_update(names)
+
+    def discard(self, name: str) -> None:
+        """Removes a channel name."""
+        with self.lock:
+            self.names.discard(name)
+            if self._added is not None and self._removed is not None:
+                self._added.discard(name)
+                self._removed.add(name)
+
+    def refresh(self) -> None:
+        """Re-reads the names from the db, keeping the changes made meanwhile."""
+        with self.lock:
+            self._added, self._removed = set(), set()
+        try:
+            names = set(get_db().get_channel_names())
+        finally:
+            with self.lock:
+                added, removed = self._added or set(), self._removed or set()
+                self._added = self._removed = None
+        with self.lock:
+            self.names = (names | added) - removed
+            self.updated_at = time.monotonic()
+
+    def has(self, name: str) -> bool:
+        """
+        Returns True if the channel is known, without re-reading the db. The
+        names are refreshed in the background every ttl.
+        """
+        with self.lock:
+            return name in self.names
+
+    def is_stale(self) -> bool:
+        """Returns True if the names should be re-read from the db."""
+        return time.monotonic() - self.updated_at > self.ttl
+
+    def get(self) -> List[str]:
+        """Returns the sorted channel names, re-reading the db if stale."""
+        if self.is_stale():
+            self.refresh()
+        with self.lock:
+            return sorted(self.names)
+
+
+channel_cache = ChannelCache(CHANNEL_CACHE_TTL)
+video_stats = VideoStats(retention_days=STATS_RETENTION_DAYS)
+
+
+def _reconcile_stats() -> None:
+    since = time.time() - STATS_RETENTION_DAYS * 24 * 60 * 60
+    video_stats.reconcile(lambda: read_recent(get_db(), since))
+
+
+async def _refresh_channels() -> None:
+    try:
+        await run_in_threadpool(channel_cache.refresh)
+    except Exception as err:  # pylint: disable=broad-except
+        log_error(f"Could not refresh the channel names: {err}")
+
+
+async def _refresh_channels_forever(delay: float) -> None:
+    # Picks up the channels written by other workers and the cli.
+    while True:
+        await asyncio.sleep(delay)
+        await _refresh_channels()
+        delay = CHANNEL_CACHE_TTL
+
 
-app = FastAPI()
+async def _reconcile_stats_forever() -> None:
+    while True:
+        try:
+            await run_in_threadpool(_reconcile_stats)
+        except Exception as err:  # pylint: disable=broad-except
+            log_error(f"Could not reconcile stats: {err}")
+        await asyncio.sleep(STATS_RECONCILE_SECS)
+
+
+def _save_warm_start(hot_channels: List[Tuple[str, List[str]]]) -> None:
+    with channel_cache.lock:
+        channels = sorted(channel_cache.names)
+    save_warm_start(
+        WARM_START_PATH, {"channels": channels, "hot_channels": hot_channels}
+    )
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    """Opens the database and loads the warm-start cache for this worker."""
+    start = time.perf_counter()
+    print(f"{__file__}: DB_PATH={DB_PATH}")
+    if not any(getattr(r, "name", None) == "www" for r in _app.routes):
+        _app.mount("/www", StaticFiles(directory=os.path.join(HERE, "www")), "www")
+    STARTUP_TIMINGS["static_mount"] = time.perf_counter() - start
+    t0 = time.perf_counter()
+    warm = await run_in_threadpool(
+        load_warm_start, WARM_START_PATH, ["channels", "hot_channels"]
+    )
+    STARTUP_TIMINGS["warm_start_load"] = time.perf_counter() - t0
+    channels = (warm or {}).get("channels")
+    if isinstance(channels, list) and all(isinstance(c, str) for c in channels):
+        channel_cache.set(channels)
+        channel_cache.from_warm_start = True
+    await run_in_threadpool(get_db)
+    if not channel_cache.from_warm_start:
+        t0 = time.perf_counter()
+        await run_in_threadpool(channel_cache.get)
+        STARTUP_TIMINGS["channels_load"] = time.perf_counter() - t0
+    if warm is not None and "hot_channels" in warm:
+        # Rebuilt in the background, after the debounce delay.
+        materialized_feeds.prewarm(warm["hot_channels"])
+    # The first reconcile builds the stats, off the startup path.
+    # A warm-start list may be days old, it only covers the cold start.
+    refresh_delay = 0.0 if channel_cache.from_warm_start else CHANNEL_CACHE_TTL
+    tasks = [
+        asyncio.ensure_future(_reconcile_stats_forever()),
+        asyncio.ensure_future(_refresh_channels_forever(refresh_delay)),
+    ]
+    STARTUP_TIMINGS["lifespan_total"] = time.perf_counter() - start
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        _shutdown_ingest_pool()
+        materialized_feeds.close()
+        try:
+            hot_channels = materialized_feeds.hot_channels()
+            await run_in_threadpool(_save_warm_start, hot_channels)
+        except OSError as err:
+            log_error(f"Could not save warm start file: {err}")
 
+
+app = FastAPI(lifespan=lifespan)
+
+
+def _is_configured_api_key(api_key: str) -> bool:
+    """True only for the real API_KEY, used to key the rate limits."""
+    return "API_KEY" in os.environ and api_key == os.environ["API_KEY"]
+
+
+admission_controller = AdmissionController(is_known_key=_is_configured_api_key)
+single_flight = SingleFlight(window=SINGLE_FLIGHT_WINDOW)
+
+# Middlewares added later wrap the earlier ones: requests are admitted before
+# their gzip body is inflated, and the 429/503 responses carry CORS headers.
+app.add_middleware(GzipRequestMiddleware)
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -72,6 +320,26 @@ class RssResponse(Response):  # pylint: disable=too-few-public-methods
     charset = "utf-8"
 
 
+class JsonBytesResponse(Response):  # pylint: disable=too-few-public-methods
+    """Returns already serialized json, see to_json_bytes()."""
+
+    media_type = "application/json"
+
+
+def to_json_bytes(data: object) -> bytes:
+    """Serializes the data the same way as JSONResponse."""
+    return json.dumps(
+        data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _on_videos_changed(channel_names: List[str]) -> None:
+    """Updates the in-memory structures after a write."""
+    channel_cache.add(channel_names)
+    single_flight.invalidate(channel_names)
+    materialized_feeds.mark_dirty(channel_names)
+
+
 def valid_api_key(api_key: Optional[str]) -> bool:
     """Checks if the api key is valid."""
     if "API_KEY" in os.environ:
@@ -84,10 +352,6 @@ def log_error(msg: str) -> None:
     print(msg)
 
 
-# Mount all the static files.
-app.mount("/www", StaticFiles(directory=os.path.join(HERE, "www")), "www")
-
-
 # Redirect to index.html
 @app.get("/", include_in_schema=False)
 async def index() -> RedirectResponse:
@@ -111,6 +375,13 @@ async def api_info() -> JSONResponse:
         "processid": os.getpid(),
         "threadid": threading.get_ident(),
         "mode": MODE,
+        "startup": {
+            "stages_secs": STARTUP_TIMINGS,
+            "warm_start": channel_cache.from_warm_start,
+        },
+        "admission": admission_controller.stats(),
+        "single_flight": single_flight.stats(),
+        "materialized_feeds": materialized_feeds.stats(),
     }
     return JSONResponse(out)
 
@@ -118,40 +389,120 @@ async def api_info() -> JSONResponse:
 @app.get("/info/channels")
 async def api_info_channels() -> JSONResponse:
     """Api endpoint for getting the version."""
-    return JSONResponse(sorted(vids_db.get_channel_names()))
+    return JSONResponse(channel_cache.get())
+
+
+def _search_bytes(query: str) -> bytes:
+    vids = get_db().query_video_list(query)
+    return to_json_bytes([v.to_json() for v in vids])
+
+
+def _rss_channel_bytes(channel: str) -> bytes:
+    now = datetime.now()
+    start = now - timedelta(days=7)
+    out = get_db().get_video_list(start, now, channel)
+    return to_rss(title=channel, vid_list=out).encode("utf-8")
+
+
+def _rss_all_bytes(hours_ago: int) -> bytes:
+    now = datetime.now()
+    start = now - timedelta(hours=hours_ago)
+    out = get_db().get_video_list(start, now)
+    return to_rss(title="AllVids", vid_list=out).encode("utf-8")
+
+
+def _json_channel_bytes(channel: str, days: int, limit: int) -> bytes:
+    now = datetime.now()
+    start = now - timedelta(days=days)
+    vids = get_db().get_video_list(start, now, channel, limit)
+    return to_json_bytes([v.to_json() for v in vids])
+
+
+def _json_multi_bytes(hours_ago: int, channel_names: Tuple[str, ...]) -> bytes:
+    now = datetime.now()
+    start = now - timedelta(hours=hours_ago)
+    vids = []
+    for channel in channel_names:
+        vids += get_db().get_video_list(start, now, channel)
+    json_vids = [v.to_json() for v in vids]
+    # Sort json_vids by date_published
+    json_vids.sort(
+        key=lambda v: parse_datetime(v["date_published"]).timestamp(),
+        reverse=True,
+    )
+    return to_json_bytes(json_vids)
+
+
+def _json_all_bytes(hours_ago: int) -> bytes:
+    now = datetime.now()
+    start = now - timedelta(hours=hours_ago)
+    vids = get_db().get_video_list(start, now)
+    return to_json_bytes([v.to_json() for v in vids])
+
+
+@app.get("/stats")
+async def api_stats(channel: Optional[str] = None, limit: int = 10) -> JSONResponse:
+    """Api endpoint for the incrementally maintained video statistics."""
+    reconciled_at = video_stats.reconciled_at
+    out = {
+        "retention_days": video_stats.retention_days,
+        "reconciled_at": (
+            datetime.fromtimestamp(reconciled_at).astimezone().isoformat()
+            if reconciled_at is not None
+            else None
+        ),
+        "videos_per_channel_per_day": video_stats.videos_per_channel_per_day(channel),
+        "top_channels_by_views_24h": video_stats.top_channels_by_views(
+            min(max(1, limit), 1000)
+        ),
+        "ingest_rate_by_source": video_stats.ingest_rate_by_source(),
+    }
+    return JSONResponse(out)
 
 
 @app.get("/search")
-async def api_search(query: str) -> JSONResponse:
+async def api_search(query: str) -> JsonBytesResponse:
     """Api endpoint for getting the version."""
-    vids = vids_db.query_video_list(query)
-    json_vids = [v.to_json() for v in vids]
-    return JSONResponse(json_vids)
+    body = await single_flight.do(("search", query), lambda: _search_bytes(query))
+    return JsonBytesResponse(body)
+
+
+materialized_feeds = MaterializedFeeds(
+    builders={
+        "rss": _rss_channel_bytes,
+        "json": lambda channel: _json_channel_bytes(
+            channel, DEFAULT_JSON_DAYS, DEFAULT_JSON_LIMIT
+        ),
+    },
+    single_flight=single_flight,
+    max_channels=MATERIALIZED_FEED_CHANNELS,
+    ttl=MATERIALIZED_FEED_TTL,
+    debounce=MATERIALIZED_FEED_DEBOUNCE,
+    is_known=channel_cache.has,
+)
 
 
 @app.get("/rss")
 async def api_rss_channel_feed(channel: str) -> RssResponse:
     """Api endpoint for adding a video"""
-    now = datetime.now()
-    start = now - timedelta(days=7)
-    out = vids_db.get_video_list(start, now, channel)
-    return RssResponse(to_rss(title=channel, vid_list=out))
+    body = await materialized_feeds.get(channel, "rss")
+    return RssResponse(body)
 
 
 @app.get("/rss/all")
 async def api_rss_all_feed(hours_ago: int) -> RssResponse:
     """Api endpoint for adding a video"""
-    now = datetime.now()
     hours_ago = min(max(0, hours_ago), 48)
-    start = now - timedelta(hours=hours_ago)
-    out = vids_db.get_video_list(start, now)
-    return RssResponse(to_rss(title="AllVids", vid_list=out))
+    body = await single_flight.do(
+        ("rss/all", hours_ago), lambda: _rss_all_bytes(hours_ago)
+    )
+    return RssResponse(body)
 
 
 @app.post("/json/from_urls")
 async def api_json_urls(query: UrlQuery) -> JSONResponse:
     """Api endpoint for adding a video"""
-    vids = vids_db.get_by_urls(query.urls)
+    vids = await run_in_threadpool(get_db().get_by_urls, query.urls)
     json_vids = [v.to_json() for v in vids]
     return JSONResponse(json_vids)
 
@@ -159,45 +510,42 @@ async def api_json_urls(query: UrlQuery) -> JSONResponse:
 @app.get("/json")
 async def api_json_channel_feed(
     channel: str, days: Optional[int] = None, limit: Optional[int] = None
-) -> JSONResponse:
+) -> JsonBytesResponse:
     """Api endpoint for adding a video"""
-    now = datetime.now()
-    days = days or 30
-    limit = limit or 100
-    start = now - timedelta(days=days)
-    vids = vids_db.get_video_list(start, now, channel, limit)
-    json_vids = [v.to_json() for v in vids]
-    return JSONResponse(json_vids)
+    days = days or DEFAULT_JSON_DAYS
+    limit = limit or DEFAULT_JSON_LIMIT
+    if days == DEFAULT_JSON_DAYS and limit == DEFAULT_JSON_LIMIT:
+        return JsonBytesResponse(await materialized_feeds.get(channel, "json"))
+    body = await single_flight.do(
+        ("json", channel, days, limit),
+        lambda: _json_channel_bytes(channel, days, limit),
+    )
+    return JsonBytesResponse(body)
 
 
 @app.post("/json/many")
-async def api_json_multi(query: MultiChannelJsonQuery) -> JSONResponse:
+async def api_json_multi(query: MultiChannelJsonQuery) -> JsonBytesResponse:
     """Api endpoint for adding a video"""
-    now = datetime.now()
-    start = now - timedelta(hours=query.hours_ago)
     print(query.channel_names)
-    vids = []
-    for channel in query.channel_names:
-        vids += vids_db.get_video_list(start, now, channel)
-    json_vids = [v.to_json() for v in vids]
-    # Sort json_vids by date_published
-    json_vids.sort(
-        key=lambda v: parse_datetime(v["date_published"]).timestamp(),
-        reverse=True,
+    hours_ago = query.hours_ago
+    # Normalized, so that the same set of channels shares one flight.
+    channel_names = tuple(sorted(set(query.channel_names)))
+    body = await single_flight.do(
+        ("json/many", hours_ago, channel_names),
+        lambda: _json_multi_bytes(hours_ago, channel_names),
     )
-    return JSONResponse(json_vids)
+    return JsonBytesResponse(body)
 
 
 @app.get("/json/all")
-async def api_json_all_feed(hours_ago: int) -> JSONResponse:
+async def api_json_all_feed(hours_ago: int) -> Response:
     """Api endpoint for adding a video"""
     try:
-        now = datetime.now()
         hours_ago = min(max(0, hours_ago), 48)
-        start = now - timedelta(hours=hours_ago)
-        vids = vids_db.get_video_list(start, now)
-        json_vids = [v.to_json() for v in vids]
-        return JSONResponse(json_vids)
+        body = await single_flight.do(
+            ("json/all", hours_ago), lambda: _json_all_bytes(hours_ago)
+        )
+        return JsonBytesResponse(body)
     except Exception as err:  # pylint: disable=broad-except
         error_str = str(err)
         stack_trace_str = traceback.format_exc()
@@ -208,6 +556,25 @@ async def api_json_all_feed(hours_ago: int) -> JSONResponse:
         })
 
 
+def _store_videos(vids: List[Any]) -> None:
+    """Writes the videos and folds them into the stats, run in the thread pool."""
+    get_db().update_many(vids)
+    video_stats.record(vids)
+
+
+def _store_rss(rss_str: str) -> List[Video]:
+    vids = from_rss(rss_str)
+    _store_videos(vids)
+    return vids
+
+
+def _store_json(json_str: str) -> List[Video]:
+    # parse_json() returns validated json dicts, the db expects Videos.
+    vids = [Video(**v) for v in Video.parse_json(json_str)]
+    _store_videos(vids)
+    return vids
+
+
 @app.put("/put/video")
 async def api_add_video(
     video: Video, api_key: Optional[str] = Header(None)
@@ -215,7 +582,8 @@ async def api_add_video(
     """Api endpoint for adding a snapshot."""
     if not valid_api_key(api_key):
         return JSONResponse({"ok": False, "error": "Invalid API key"})
-    vids_db.update(video)
+    await run_in_threadpool(_store_videos, [video])
+    _on_videos_changed([video.channel_name])
     return JSONResponse({"ok": True, "msg": "updated 1 video"})
 
 
@@ -231,7 +599,8 @@ async def api_add_videos(
             {"ok": False, "error": f"videos length > {MAX_BULK_UPDATE_SIZE}"},
             status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
         )
-    vids_db.update_many(videos)
+    await run_in_threadpool(_store_videos, videos)
+    _on_videos_changed([v.channel_name for v in videos])
     return JSONResponse({"ok": True, "msg": f"updated {len(videos)} videos"})
 
 
@@ -242,11 +611,60 @@ async def api_put_rss(
     """Api endpoint for adding a snapshot from rss"""
     if not valid_api_key(api_key):
         return JSONResponse({"ok": False, "error": "Invalid API key"})
-    vids = from_rss(rss_str)
-    vids_db.update_many(vids)
+    vids = await run_in_threadpool(_store_rss, rss_str)
+    _on_videos_changed([v.channel_name for v in vids])
     return JSONResponse({"ok": True})
 
 
+def _ingest_rss(
+    feeds: List[str], write: Callable[[List[Video]], None], retry: bool = True
+) -> IngestReport:
+    """
+    Runs ingest_feeds() on the shared pool. A worker that died (e.g. killed
+    for memory) breaks the pool, which is then replaced and the feeds retried
+    once, the writes are upserts.
+    """
+    pool = get_ingest_pool()
+    try:
+        return ingest_feeds(feeds, write, pool)
+    except BrokenProcessPool:
+        _shutdown_ingest_pool(pool)
+        if not retry:
+            raise
+    return _ingest_rss(feeds, write, retry=False)
+
+
+@app.put("/put/rss/many")
+async def api_put_rss_many(
+    feeds: List[str], api_key: Optional[str] = Header(None)
+) -> JSONResponse:
+    """Api endpoint for adding many rss feeds, parsed in a process pool."""
+    if not valid_api_key(api_key):
+        return JSONResponse({"ok": False, "error": "Invalid API key"})
+    if len(feeds) > MAX_BULK_RSS_FEEDS:
+        return JSONResponse(
+            {"ok": False, "error": f"feeds length > {MAX_BULK_RSS_FEEDS}"},
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+    channel_names: Set[str] = set()
+
+    def write(vids: List[Video]) -> None:
+        _store_videos(vids)
+        channel_names.update(v.channel_name for v in vids)
+
+    try:
+        report = await run_in_threadpool(_ingest_rss, feeds, write)
+    except BrokenProcessPool:
+        return JSONResponse(
+            {"ok": False, "error": "rss parser processes died"},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+    finally:
+        # Batches written before a failure are visible as well.
+        _on_videos_changed(sorted(channel_names))
+    return JSONResponse({"ok": True, **report.to_json()})
+
+
 @app.put("/put/json")
 async def api_put_json(
     json_str: str, api_key: Optional[str] = Header(None)
@@ -254,8 +672,8 @@ async def api_put_json(
     """Api endpoint for adding a snapshot from rss"""
     if not valid_api_key(api_key):
         return JSONResponse({"ok": False, "error": "Invalid API key"})
-    vids = Video.parse_json(json_str)
-    vids_db.update_many(vids)
+    vids = await run_in_threadpool(_store_json, json_str)
+    _on_videos_changed([v.channel_name for v in vids])
     return JSONResponse({"ok": True})
 
 
@@ -266,7 +684,11 @@ async def api_delete_channel(
     """Api endpoint for adding a snapshot from rss"""
     if not valid_api_key(api_key):
         return JSONResponse({"ok": False, "error": "Invalid API key"})
-    vids_db.remove_by_channel_name(channel_name)
+    await run_in_threadpool(get_db().remove_by_channel_name, channel_name)
+    channel_cache.discard(channel_name)
+    single_flight.invalidate([channel_name])
+    materialized_feeds.discard(channel_name)
+    video_stats.discard_channel(channel_name)
     return JSONResponse({"ok": True})
 
 
@@ -277,5 +699,12 @@ async def clear_videos(
     """Api endpoint for adding a snapshot."""
     if not valid_api_key(api_key):
         return JSONResponse({"ok": False, "error": "Invalid API key"})
-    vids_db.clear()
+    await run_in_threadpool(get_db().clear)
+    channel_cache.set([])
+    single_flight.invalidate()
+    materialized_feeds.clear()
+    video_stats.clear()
     return JSONResponse({"ok": True})
+
+
+STARTUP_TIMINGS["module_body"] = time.perf_counter() - _MODULE_START
@@ -0,0 +1,291 @@
+"""
+    Client for the vids_db_server api.
+
+    VidsDbClient keeps a pool of keep-alive connections, splits uploads into
+    /put/videos batches, uploads the batches in parallel and retries with
+    exponential backoff (honoring Retry-After on 429/503). At most max_parallel
+    batches are taken from the input at a time, and a failed upload reports
+    how many videos were stored before it (PartialUploadError). AsyncVidsDbClient
+    exposes the same api as coroutines for asyncio based scrapers.
+
+    Example:
+        with VidsDbClient("http://localhost:80", api_key="...") as client:
+            client.put_videos(videos)
+"""
+
+import asyncio
+import gzip
+import json
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Union
+
+import requests  # type: ignore
+from requests.adapters import HTTPAdapter  # type: ignore
+from urllib3.util.retry import Retry  # type: ignore
+from vids_db.models import Video  # type: ignore
+
+# Must not exceed MAX_BULK_UPDATE_SIZE in vids_db_server.app.
+DEFAULT_BATCH_SIZE = 1000
+
+VideoLike = Union[Video, Dict[str, Any]]
+
+
+class VidsDbClientError(Exception):
+    """Raised when the server rejects a request."""
+
+
+class PartialUploadError(VidsDbClientError):
+    """
+    Raised by put_videos() when a batch fails. uploaded is the number of
+    videos stored by the batches that succeeded, the cause is chained.
+    """
+
+    def __init__(self, uploaded: int, error: BaseException) -> None:
+        super().__init__(f"upload failed after {uploaded} videos: {error}")
+        self.uploaded = uploaded
+
+
+def _to_json(video: VideoLike) -> Dict[str, Any]:
+    return video.to_json() if isinstance(video, Video) else video
+
+
+def batched(videos: Iterable[VideoLike], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Yields the videos as json lists of at most batch_size items."""
+    batch: List[Dict[str, Any]] = []
+    for video in videos:
+        batch.append(_to_json(video))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class VidsDbClient:  # pylint: disable=too-many-instance-attributes
+    """Synchronous client with connection pooling and batched uploads."""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        base_url: str,
+        *,
+        api_key: Optional[str] = None,
+        pool_size: int = 10,
+        max_parallel: int = 4,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        gzip_requests: bool = False,
+        timeout: float = 30,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.max_parallel = max(1, max_parallel)
+        self.batch_size = min(max(1, batch_size), DEFAULT_BATCH_SIZE)
+        self.gzip_requests = gzip_requests
+        self.timeout = timeout
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            # Every route of the api is idempotent, the puts are upserts.
+            allowed_methods=frozenset(["GET", "PUT", "POST", "DELETE"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if api_key is not None:
+            self.session.headers["api-key"] = api_key
+
+    def __enter__(self) -> "VidsDbClient":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Closes the pooled connections."""
+        self.session.close()
+
+    def _request(self, method: str, path: str, data: Any = None, **kwargs: Any) -> Any:
+        headers: Dict[str, str] = {}
+        body: Optional[bytes] = None
+        if data is not None:
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            headers["content-type"] = "application/json"
+            if self.gzip_requests:
+                body = gzip.compress(body, compresslevel=5)
+                headers["content-encoding"] = "gzip"
+        resp = self.session.request(
+            method,
+            f"{self.base_url}{path}",
+            data=body,
+            headers=headers,
+            timeout=self.timeout,
+            **kwargs,
+        )
+        if resp.status_code >= 400:
+            raise VidsDbClientError(f"{method} {path} failed {resp.status_code}: {resp.text}")
+        if "json" not in resp.headers.get("content-type", ""):
+            return resp.text
+        out = resp.json()
+        if isinstance(out, dict) and out.get("ok") is False:
+            raise VidsDbClientError(f"{method} {path} failed: {out.get('error')}")
+        return out
+
+    def put_video(self, video: VideoLike) -> None:
+        """Uploads one video."""
+        self._request("PUT", "/put/video", _to_json(video))
+
+    def put_batch(self, batch: List[Dict[str, Any]]) -> int:
+        """Uploads one batch of video json, returns its size."""
+        self._request("PUT", "/put/videos", batch)
+        return len(batch)
+
+    def put_videos(self, videos: Iterable[VideoLike]) -> int:
+        """
+        Uploads the videos in batches, with at most max_parallel batches in
+        flight. Returns the number of videos uploaded. On the first failed
+        batch no further batches are started and PartialUploadError is raised
+        once the batches in flight have finished.
+        """
+        uploaded = 0
+        error: Optional[BaseException] = None
+
+        def collect(done: Set["Future[int]"]) -> None:
+            nonlocal uploaded, error
+            for future in done:
+                try:
+                    uploaded += future.result()
+                except Exception as err:  # pylint: disable=broad-except
+                    error = error or err
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as pool:
+            pending: Set["Future[int]"] = set()
+            for batch in batched(videos, self.batch_size):
+                if len(pending) >= self.max_parallel:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                if error is not None:
+                    break
+                pending.add(pool.submit(self.put_batch, batch))
+            collect(wait(pending).done)
+        if error is not None:
+            raise PartialUploadError(uploaded, error) from error
+        return uploaded
+
+    def info(self) -> Dict[str, Any]:
+        """Returns the server info."""
+        return self._request("GET", "/info")
+
+    def channels(self) -> List[str]:
+        """Returns the channel names."""
+        return self._request("GET", "/info/channels")
+
+    def json_feed(
+        self, channel: str, days: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Returns the json feed of the channel."""
+        params: Dict[str, Any] = {"channel": channel}
+        if days is not None:
+            params["days"] = days
+        if limit is not None:
+            params["limit"] = limit
+        return self._request("GET", "/json", params=params)
+
+    def rss_feed(self, channel: str) -> str:
+        """Returns the rss feed of the channel."""
+        return self._request("GET", "/rss", params={"channel": channel})
+
+
+class AsyncVidsDbClient:
+    """
+    Asyncio version of VidsDbClient. The requests run on the pooled
+    connections of a VidsDbClient in a dedicated thread pool, so concurrent
+    coroutines share the keep-alive connections.
+    """
+
+    def __init__(self, base_url: str, **kwargs: Any) -> None:
+        self.client = VidsDbClient(base_url, **kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=self.client.max_parallel)
+
+    async def __aenter__(self) -> "AsyncVidsDbClient":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Closes the pooled connections."""
+        self._executor.shutdown(wait=True)
+        self.client.close()
+
+    async def _run(self, func: Any, *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def put_video(self, video: VideoLike) -> None:
+        """Uploads one video."""
+        await self._run(self.client.put_video, video)
+
+    async def put_videos(self, videos: Iterable[VideoLike]) -> int:
+        """
+        Uploads the videos in batches, see VidsDbClient.put_videos(). If the
+        caller is cancelled the batches in flight are cancelled as well.
+        """
+        uploaded = 0
+        error: Optional[BaseException] = None
+
+        def collect(done: Set["asyncio.Future[int]"]) -> None:
+            nonlocal uploaded, error
+            for task in done:
+                if task.cancelled():
+                    error = error or asyncio.CancelledError()
+                elif task.exception() is None:
+                    uploaded += task.result()
+                else:
+                    error = error or task.exception()
+
+        pending: Set["asyncio.Future[int]"] = set()
+        try:
+            for batch in batched(videos, self.client.batch_size):
+                if len(pending) >= self.client.max_parallel:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    collect(done)
+                if error is not None:
+                    break
+                pending.add(asyncio.ensure_future(self._run(self.client.put_batch, batch)))
+            if pending:
+                done, pending = await asyncio.wait(pending)
+                collect(done)
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        if error is not None:
+            raise PartialUploadError(uploaded, error) from error
+        return uploaded
+
+    async def info(self) -> Dict[str, Any]:
+        """Returns the server info."""
+        return await self._run(self.client.info)
+
+    async def channels(self) -> List[str]:
+        """Returns the channel names."""
+        return await self._run(self.client.channels)
+
+    async def json_feed(
+        self, channel: str, days: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Returns the json feed of the channel."""
+        return await self._run(self.client.json_feed, channel, days, limit)
+
+    async def rss_feed(self, channel: str) -> str:
+        """Returns the rss feed of the channel."""
+        return await self._run(self.client.rss_feed, channel)
@@ -1,8 +1,17 @@
 """vids_db command line tool."""
 
+import argparse
+import json
 import os
 import sys
 import webbrowser
+from contextlib import ExitStack
+from typing import Any, Dict, List
+
+import requests  # type: ignore
+from vids_db.models import Video  # type: ignore
+
+from vids_db_server.ingest import ingest_feeds, make_pool
 
 
 def main() -> None:
@@ -12,5 +21,74 @@ def main() -> None:
     sys.exit(0)
 
 
+def _read_feed(src: str) -> str:
+    if src.startswith(("http://", "https://")):
+        resp = requests.get(src, timeout=30)
+        resp.raise_for_status()
+        return resp.text
+    with open(src, encoding="utf-8", mode="rt") as fd:
+        return fd.read()
+
+
+def ingest_main() -> None:  # pylint: disable=too-many-locals
+    """Parses many rss feeds in parallel and stores the videos."""
+    parser = argparse.ArgumentParser(description=ingest_main.__doc__)
+    parser.add_argument("feeds", nargs="+", help="rss files or urls")
+    parser.add_argument(
+        "--db-path",
+        default=os.environ.get("DB_PATH_DIR", "data"),
+        help="database directory to write to (default: $DB_PATH_DIR or ./data)",
+    )
+    parser.add_argument("--server", help="upload to this server instead of a local db")
+    parser.add_argument("--api-key", default=os.environ.get("API_KEY"))
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+    feeds: List[str] = []
+    sources: List[str] = []
+    read_errors = []
+    for src in args.feeds:
+        try:
+            feeds.append(_read_feed(src))
+            sources.append(src)
+        except (OSError, requests.RequestException) as err:
+            read_errors.append({"feed": src, "error": str(err)})
+    upload_errors: List[Dict[str, Any]] = []
+    not_uploaded = 0
+    with ExitStack() as stack:
+        if args.server:
+            # pylint: disable=import-outside-toplevel
+            from vids_db_server.client import PartialUploadError, VidsDbClient
+
+            client = stack.enter_context(VidsDbClient(args.server, api_key=args.api_key))
+
+            def write(vids: List[Video]) -> None:
+                # Keeps going with the other feeds, the failure is reported.
+                nonlocal not_uploaded
+                try:
+                    client.put_videos(vids)
+                except PartialUploadError as err:
+                    not_uploaded += len(vids) - err.uploaded
+                    upload_errors.append({"upload": args.server, "error": str(err)})
+
+        else:
+            from vids_db.database import Database  # type: ignore  # pylint: disable=import-outside-toplevel
+
+            db = Database(args.db_path)
+
+            def write(vids: List[Video]) -> None:
+                db.update_many(vids)
+
+        pool = stack.enter_context(make_pool(args.processes))
+        report = ingest_feeds(feeds, write, pool)
+    out = report.to_json()
+    out["videos"] -= not_uploaded
+    # Map the indices of the parse errors back to the feed names.
+    for error in out["errors"]:
+        error["feed"] = sources[error["feed"]]
+    out["errors"] = read_errors + out["errors"] + upload_errors
+    print(json.dumps(out, indent=2))
+    sys.exit(1 if out["errors"] else 0)
+
+
 if __name__ == "__main__":
     main()
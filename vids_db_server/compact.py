@@ -0,0 +1,98 @@
+"""
+    Compact keyed store of per-video records for in-process caches.
+
+    A dict of tuples costs a tuple, a float and an int object per video on top
+    of the dict entry, plus a copy of the channel name for every video read
+    from the database. VideoStore keeps the numeric fields in typed arrays
+    indexed by a slot per url, interns the channel names into small integer
+    ids and reuses the slots of removed videos, so a cache of many videos
+    costs little more than its url keys.
+"""
+
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# (channel, published epoch, views)
+VideoRecord = Tuple[str, float, int]
+
+
+class _Interner:  # pylint: disable=too-few-public-methods
+    """Maps repeated strings to small integer ids."""
+
+    def __init__(self) -> None:
+        self.values: List[str] = []
+        self.ids: Dict[str, int] = {}
+
+    def id_of(self, value: str) -> int:
+        """Returns the id of the value, adding it if needed."""
+        idx = self.ids.get(value)
+        if idx is None:
+            idx = len(self.values)
+            self.values.append(value)
+            self.ids[value] = idx
+        return idx
+
+
+class VideoStore:
+    """Upsertable struct-of-arrays store of VideoRecords keyed by video url."""
+
+    def __init__(self) -> None:
+        self.clear()
+
+    def clear(self) -> None:
+        """Removes all the videos."""
+        self._slots: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._channels = _Interner()
+        self.channel_ids = array("I")
+        self.published = array("d")
+        self.views = array("q")
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, url: object) -> bool:
+        return url in self._slots
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._slots)
+
+    def _record(self, slot: int) -> VideoRecord:
+        channel = self._channels.values[self.channel_ids[slot]]
+        return channel, self.published[slot], self.views[slot]
+
+    def get(self, url: str) -> Optional[VideoRecord]:
+        """Returns the record of the url, or None."""
+        slot = self._slots.get(url)
+        return None if slot is None else self._record(slot)
+
+    def put(self, url: str, channel: str, published: float, views: int) -> None:
+        """Adds or replaces the record of the url."""
+        channel_id = self._channels.id_of(channel)
+        slot = self._slots.get(url)
+        if slot is None and self._free:
+            slot = self._free.pop()
+        if slot is None:
+            self._slots[url] = len(self.channel_ids)
+            self.channel_ids.append(channel_id)
+            self.published.append(published)
+            self.views.append(views)
+            return
+        self._slots[url] = slot
+        self.channel_ids[slot] = channel_id
+        self.published[slot] = published
+        self.views[slot] = views
+
+    def pop(self, url: str) -> VideoRecord:
+        """Removes the record of the url and returns it, raises KeyError if missing."""
+        slot = self._slots.pop(url)
+        self._free.append(slot)
+        return self._record(slot)
+
+    def urls_of_channel(self, channel: str) -> List[str]:
+        """Returns the urls of the channel's videos."""
+        channel_id = self._channels.ids.get(channel)
+        if channel_id is None:
+            return []
+        channel_ids = self.channel_ids
+        return [url for url, slot in self._slots.items() if channel_ids[slot] == channel_id]
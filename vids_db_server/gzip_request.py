@@ -0,0 +1,85 @@
+"""
+    Decompresses request bodies sent with "Content-Encoding: gzip", so that
+    uploaders can compress their /put payloads. The inflation runs in the
+    thread pool, so a large body does not stall the event loop.
+"""
+
+import os
+import zlib
+from typing import List, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from vids_db_server.admission import send_json_error
+
+# Upper bound of a decompressed body, protects against gzip bombs.
+MAX_DECOMPRESSED_SIZE = int(os.environ.get("MAX_DECOMPRESSED_SIZE", str(64 * 1024 * 1024)))
+
+
+class GzipRequestMiddleware:  # pylint: disable=too-few-public-methods
+    """Pure ASGI middleware that inflates gzip encoded request bodies."""
+
+    def __init__(self, app: ASGIApp, max_size: int = MAX_DECOMPRESSED_SIZE) -> None:
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not _is_gzip(scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+        inflater = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        chunks: List[bytes] = []
+        size = 0
+        more_body = True
+        try:
+            while more_body:
+                message = await receive()
+                if message["type"] != "http.request":
+                    # Client disconnected, let the app see it.
+                    await self.app(scope, _replay(message, receive), send)
+                    return
+                more_body = message.get("more_body", False)
+                chunk = await run_in_threadpool(
+                    inflater.decompress, message.get("body", b""), self.max_size - size + 1
+                )
+                size += len(chunk)
+                if size > self.max_size or inflater.unconsumed_tail:
+                    await send_json_error(send, 413, "decompressed body too large")
+                    return
+                chunks.append(chunk)
+            chunks.append(await run_in_threadpool(inflater.flush))
+        except zlib.error:
+            await send_json_error(send, 400, "invalid gzip body")
+            return
+        body = b"".join(chunks)
+        headers = [
+            (key, val)
+            for key, val in scope["headers"]
+            if key not in (b"content-encoding", b"content-length")
+        ]
+        headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        scope = dict(scope, headers=headers)
+        message = {"type": "http.request", "body": body, "more_body": False}
+        await self.app(scope, _replay(message, receive), send)
+
+
+def _is_gzip(headers: List[Tuple[bytes, bytes]]) -> bool:
+    for key, val in headers:
+        if key == b"content-encoding":
+            return val.strip().lower() == b"gzip"
+    return False
+
+
+def _replay(first: Message, receive: Receive) -> Receive:
+    """Returns first, then defers to the original receive."""
+    sent = False
+
+    async def replay() -> Message:
+        nonlocal sent
+        if not sent:
+            sent = True
+            return first
+        return await receive()
+
+    return replay
@@ -0,0 +1,102 @@
+"""
+    Parallel ingestion of many rss feeds.
+
+    feedparser is pure python and cpu bound, so the feeds are parsed in a pool
+    of processes. The parsed videos stream back to the
+    calling thread, which is the single writer and stores them in batches.
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from vids_db.models import Video  # type: ignore
+
+from vids_db_server.rss import from_rss
+
+# Videos handed to the writer at once.
+WRITE_BATCH_SIZE = 1000
+
+
+def parse_feed(rss_str: str) -> Tuple[List[Video], Optional[str]]:
+    """
+    Parses one feed in a worker process. Returns the videos, or an empty list
+    and the error message if the feed could not be parsed.
+    """
+    try:
+        return from_rss(rss_str), None
+    except Exception as err:  # pylint: disable=broad-except
+        return [], f"{type(err).__name__}: {err}"
+
+
+def make_pool(processes: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Returns a process pool for parse_feed(), sized to the cores by default.
+    The workers are started from a clean forkserver (spawn where that is not
+    available), so they do not inherit the threads and sockets of a server.
+    """
+    processes = processes or int(os.environ.get("INGEST_PROCESSES", "0")) or os.cpu_count()
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(
+        max_workers=processes, mp_context=multiprocessing.get_context(method)
+    )
+
+
+class IngestReport:  # pylint: disable=too-few-public-methods
+    """Summary of an ingestion run."""
+
+    def __init__(self) -> None:
+        self.feeds = 0
+        self.videos = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.elapsed = 0.0
+
+    def to_json(self) -> Dict[str, Any]:
+        """Returns the report as a json dict."""
+        return {
+            "feeds": self.feeds,
+            "videos": self.videos,
+            "errors": self.errors,
+            "elapsed_secs": self.elapsed,
+            "feeds_per_sec": self.feeds / self.elapsed if self.elapsed > 0 else 0.0,
+        }
+
+
+def ingest_feeds(
+    feeds: Iterable[str],
+    write: Callable[[List[Video]], None],
+    pool: Optional[Executor] = None,
+    chunksize: int = 8,
+) -> IngestReport:
+    """
+    Parses the feeds in the process pool and calls write() from this thread
+    with batches of at most WRITE_BATCH_SIZE videos. If no pool is given a
+    temporary one is created.
+    """
+    report = IngestReport()
+    start = time.perf_counter()
+    owns_pool = pool is None
+    executor = pool if pool is not None else make_pool()
+    pending: List[Video] = []
+    try:
+        results = executor.map(parse_feed, feeds, chunksize=chunksize)
+        for index, (vids, error) in enumerate(results):
+            report.feeds += 1
+            if error is not None:
+                report.errors.append({"feed": index, "error": error})
+                continue
+            pending.extend(vids)
+            while len(pending) >= WRITE_BATCH_SIZE:
+                batch, pending = pending[:WRITE_BATCH_SIZE], pending[WRITE_BATCH_SIZE:]
+                write(batch)
+                report.videos += len(batch)
+        if pending:
+            write(pending)
+            report.videos += len(pending)
+    finally:
+        if owns_pool:
+            executor.shutdown(wait=True)
+        report.elapsed = time.perf_counter() - start
+    return report
@@ -0,0 +1,190 @@
+"""
+    Materialized per-channel feeds.
+
+    The default-parameter /rss and /json responses of a channel only change
+    when that channel is written to, so their bytes are kept for the most
+    recently requested channels. A write drops the channel's bytes right away
+    (readers fall back to the single-flight query) and schedules a debounced
+    background rebuild, so that a burst of writes to one channel costs one
+    rebuild. Entries also expire after a ttl, which covers writes made by
+    other workers and the sliding of the date window, so a worker that did not
+    handle a write can serve feeds up to ttl seconds stale. Only channels
+    accepted by is_known (the channels in the database, as last refreshed)
+    are materialized, requests for other names are answered without taking
+    an entry.
+
+    All the state is owned by the event loop, the builds run in the thread
+    pool through the SingleFlight layer.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from vids_db_server.single_flight import SingleFlight
+
+
+class _Entry:  # pylint: disable=too-few-public-methods
+    """The materialized payloads of one channel."""
+
+    __slots__ = ("version", "kinds", "payloads")
+
+    def __init__(self) -> None:
+        self.version = 0
+        self.kinds: Set[str] = set()  # The kinds that have been requested.
+        self.payloads: Dict[str, Tuple[float, bytes]] = {}
+
+
+def _is_hot_pair(pair: Any) -> bool:
+    return (
+        isinstance(pair, (list, tuple))
+        and len(pair) == 2
+        and isinstance(pair[0], str)
+        and isinstance(pair[1], list)
+        and all(isinstance(kind, str) for kind in pair[1])
+    )
+
+
+class MaterializedFeeds:  # pylint: disable=too-many-instance-attributes
+    """LRU bounded store of prebuilt per-channel feed bytes."""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        builders: Dict[str, Callable[[str], bytes]],
+        single_flight: SingleFlight,
+        *,
+        max_channels: int = 1000,
+        ttl: float = 60.0,
+        debounce: float = 0.5,
+        is_known: Optional[Callable[[str], bool]] = None,
+    ) -> None:
+        self.builders = builders
+        self.single_flight = single_flight
+        self.max_channels = max_channels
+        self.ttl = ttl
+        self.debounce = debounce
+        self.is_known = is_known
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        self._flush_task: Optional["asyncio.Task[None]"] = None
+
+    async def get(self, channel: str, kind: str) -> bytes:
+        """Returns the feed bytes, building them if they are not materialized."""
+        entry = self._entries.get(channel)
+        if entry is not None:
+            self._entries.move_to_end(channel)
+            payload = entry.payloads.get(kind)
+            if payload is not None and time.monotonic() - payload[0] < self.ttl:
+                self.hits += 1
+                return payload[1]
+        self.misses += 1
+        if entry is None and self.is_known is not None and not self.is_known(channel):
+            builder = self.builders[kind]
+            return await self.single_flight.do((kind, channel), lambda: builder(channel))
+        return await self._build(channel, kind)
+
+    async def _build(self, channel: str, kind: str) -> bytes:
+        entry = self._entry(channel)
+        entry.kinds.add(kind)
+        version = entry.version
+        builder = self.builders[kind]
+        body = await self.single_flight.do((kind, channel), lambda: builder(channel))
+        # Only keep the bytes if the channel was not written to (or evicted)
+        # meanwhile.
+        if self._entries.get(channel) is entry and entry.version == version:
+            entry.payloads[kind] = (time.monotonic(), body)
+        return body
+
+    def _entry(self, channel: str) -> _Entry:
+        entry = self._entries.get(channel)
+        if entry is None:
+            entry = _Entry()
+            self._entries[channel] = entry
+            while len(self._entries) > self.max_channels:
+                evicted, _ = self._entries.popitem(last=False)
+                self._dirty.discard(evicted)
+        self._entries.move_to_end(channel)
+        return entry
+
+    def mark_dirty(self, channels: Iterable[str]) -> None:
+        """Called after a write, schedules a rebuild of the hot channels."""
+        for channel in channels:
+            entry = self._entries.get(channel)
+            if entry is None:
+                continue
+            entry.version += 1
+            entry.payloads.clear()
+            self._dirty.add(channel)
+        if self._dirty and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.ensure_future(self._flush())
+
+    async def _flush(self) -> None:
+        await asyncio.sleep(self.debounce)
+        dirty, self._dirty = self._dirty, set()
+        for channel in dirty:
+            entry = self._entries.get(channel)
+            if entry is None:
+                continue
+            for kind in sorted(entry.kinds):
+                self.rebuilds += 1
+                try:
+                    await self._build(channel, kind)
+                except Exception as err:  # pylint: disable=broad-except
+                    # The next request rebuilds it, or reports the error.
+                    print(f"{__file__}: rebuild of {kind} {channel} failed: {err}")
+        if self._dirty:
+            self._flush_task = asyncio.ensure_future(self._flush())
+
+    def prewarm(self, hot: Any) -> None:
+        """
+        Registers (channel, kinds) pairs, as saved from hot_channels(), and
+        schedules their build. Malformed pairs and unknown channels or kinds
+        are skipped.
+        """
+        if not isinstance(hot, list):
+            return
+        channels = []
+        for pair in hot:
+            if not _is_hot_pair(pair):
+                continue
+            channel, kinds = pair
+            if self.is_known is not None and not self.is_known(channel):
+                continue
+            if kinds and all(kind in self.builders for kind in kinds):
+                self._entry(channel).kinds.update(kinds)
+                channels.append(channel)
+        self.mark_dirty(channels)
+
+    def hot_channels(self) -> List[Tuple[str, List[str]]]:
+        """Returns the (channel, kinds) pairs, least recently used first."""
+        return [(channel, sorted(entry.kinds)) for channel, entry in self._entries.items()]
+
+    def close(self) -> None:
+        """Cancels a pending rebuild, called on shutdown."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+    def discard(self, channel: str) -> None:
+        """Forgets the channel, called when it is deleted."""
+        self._entries.pop(channel, None)
+        self._dirty.discard(channel)
+
+    def clear(self) -> None:
+        """Forgets all the channels."""
+        self._entries.clear()
+        self._dirty.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the counters of the store."""
+        return {
+            "channels": len(self._entries),
+            "max_channels": self.max_channels,
+            "hits": self.hits,
+            "misses": self.misses,
+            "rebuilds": self.rebuilds,
+        }
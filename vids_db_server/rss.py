@@ -4,7 +4,6 @@
 
 from typing import List
 
-import feedparser  # type: ignore
 from vids_db.models import Video  # type: ignore
 
 from vids_db_server.date import iso_fmt
@@ -58,6 +57,9 @@ def from_rss(rss_str: str) -> List[Video]:
     """
     Returns a list of VideoInfo objects from an RSS stream.
     """
+    # Imported lazily, feedparser is only needed by the rss ingestion paths.
+    import feedparser  # type: ignore  # pylint: disable=import-outside-toplevel
+
     out: List[Video] = []
     parsed = feedparser.parse(rss_str)
     for entry in parsed.entries:
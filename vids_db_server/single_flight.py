@@ -0,0 +1,111 @@
+"""
+    Request coalescing (single-flight) for identical concurrent queries.
+
+    The first request for a key runs the work in the thread pool, concurrent
+    requests for the same key await that same result instead of querying the
+    database again. A completed result is kept for a short window so that
+    slightly later arrivals can join as well.
+
+    Keys are tuples of (kind, *args). A write only invalidates the keys that
+    name one of the written channels plus the cross-channel kinds, so unrelated
+    in-flight work stays joinable.
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+MAX_RECENT = 1024
+
+# Kinds whose results span every channel, dropped on any write.
+CROSS_CHANNEL_KINDS = frozenset(["search", "rss/all", "json/all", "json/many"])
+
+
+def _consume_exception(task: "asyncio.Future[Any]") -> None:
+    # Avoids "exception was never retrieved" if every waiter went away.
+    if not task.cancelled():
+        task.exception()
+
+
+def _touches(key: Hashable, channels: Iterable[str]) -> bool:
+    """Returns True if the result of key may depend on one of the channels."""
+    parts = key if isinstance(key, tuple) else (key,)
+    if parts and parts[0] in CROSS_CHANNEL_KINDS:
+        return True
+    return any(channel in parts for channel in channels)
+
+
+class SingleFlight:
+    """Shares one in-flight computation between identical requests."""
+
+    def __init__(self, window: float = 0.0) -> None:
+        self.window = window
+        self.leaders = 0
+        self.joined = 0
+        self._inflight: Dict[Hashable, "asyncio.Future[bytes]"] = {}
+        self._recent: Dict[Hashable, Tuple[float, bytes]] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], bytes]) -> bytes:
+        """Returns the result of func(), shared with identical requests."""
+        recent = self._recent.get(key)
+        if recent is not None:
+            if recent[0] > time.monotonic():
+                self.joined += 1
+                return recent[1]
+            del self._recent[key]
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(run_in_threadpool(func))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_done(key, t))
+        else:
+            self.joined += 1
+        # Shielded so that a disconnecting client does not cancel the work
+        # for everyone else waiting on it.
+        return await asyncio.shield(task)
+
+    def _on_done(self, key: Hashable, task: "asyncio.Future[bytes]") -> None:
+        _consume_exception(task)
+        # A task that is no longer registered was invalidated while running,
+        # its result may predate the write and is not kept.
+        if self._inflight.get(key) is not task:
+            return
+        del self._inflight[key]
+        if self.window <= 0:
+            return
+        if task.cancelled() or task.exception() is not None:
+            return
+        now = time.monotonic()
+        if len(self._recent) >= MAX_RECENT:
+            self._recent = {k: v for k, v in self._recent.items() if v[0] > now}
+            if len(self._recent) >= MAX_RECENT:
+                self._recent.clear()
+        self._recent[key] = (now + self.window, task.result())
+
+    def invalidate(self, channels: Optional[Iterable[str]] = None) -> None:
+        """
+        Called when the data of the channels changes, or of every channel if
+        channels is None. The affected completed results are dropped and new
+        requests no longer join affected computations that started before the
+        change.
+        """
+        if channels is None:
+            self._recent.clear()
+            self._inflight.clear()
+            return
+        names = set(channels)
+        for cache in (self._recent, self._inflight):
+            for key in [k for k in cache if _touches(k, names)]:
+                del cache[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the coalescing counters."""
+        return {
+            "window": self.window,
+            "leaders": self.leaders,
+            "joined": self.joined,
+            "inflight": len(self._inflight),
+        }
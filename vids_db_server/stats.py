@@ -0,0 +1,292 @@
+"""
+    Incrementally maintained video statistics for the /stats api.
+
+    The put paths call VideoStats.record() with every written video, which
+    updates the aggregates in place:
+        - videos per channel per day (utc publish date)
+        - total views per channel of the videos published in the last 24h
+        - videos ingested per source over the last hour and day
+    The per-video state is kept in a compact VideoStore, only for the
+    retention window, and the aggregates are periodically rebuilt from the
+    database by reconcile(), which also folds in the writes made by other
+    workers. The rows for it are read by read_recent() as a column
+    projection, without building models. Videos recorded while the rows are
+    read are replayed after the rebuild, so they are not lost.
+
+    The ingest rates are rebuilt from the date_lastupdated of the stored rows,
+    which covers every worker (but only videos published within the
+    retention window), and this worker's puts are counted on top until the
+    next reconcile.
+"""
+
+import heapq
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from vids_db.database import Database  # type: ignore
+from vids_db.date import parse_datetime  # type: ignore
+from vids_db.models import Video  # type: ignore
+
+from vids_db_server.compact import VideoStore
+
+DAY_SECS = 24 * 60 * 60
+
+VideoLike = Union[Video, Dict[str, Any]]
+# (url, channel, source, published epoch, views, last updated epoch)
+StatsRow = Tuple[str, str, str, float, int, float]
+
+# The heap is rebuilt when it holds more than this many stale entries.
+MAX_STALE_HEAP = 1024
+
+READ_RECENT_STMT = (
+    "SELECT url, channel_name, json_extract(data, '$.source'), timestamp_published,"
+    " json_extract(data, '$.views'),"
+    " CAST(strftime('%s', json_extract(data, '$.date_lastupdated')) AS INTEGER)"
+    " FROM videos WHERE timestamp_published >= ?"
+)
+
+
+def _fields(vid: VideoLike) -> StatsRow:
+    """Returns the StatsRow of a video."""
+    if isinstance(vid, Video):
+        return (
+            vid.url,
+            vid.channel_name,
+            vid.source,
+            vid.date_published.timestamp(),
+            vid.views,
+            vid.date_lastupdated.timestamp(),
+        )
+    published = parse_datetime(f"{vid['date_published']}").timestamp()
+    lastupdated = parse_datetime(f"{vid['date_lastupdated']}").timestamp()
+    return vid["url"], vid["channel_name"], vid["source"], published, int(vid["views"]), lastupdated
+
+
+def read_recent(db: Database, since: float) -> List[StatsRow]:
+    """Returns the stats rows of the videos published since the epoch."""
+    with db.db_sqlite.open_db_for_read() as conn:
+        rows = conn.execute(READ_RECENT_STMT, (int(since),)).fetchall()
+    return [
+        (url, channel, source or "", float(published), int(views or 0), float(lastupdated or 0))
+        for url, channel, source, published, views, lastupdated in rows
+    ]
+
+
+def _day(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%d")
+
+
+class RollingCounter:
+    """Per key counts over a sliding window, kept in fixed size time buckets."""
+
+    def __init__(self, window_secs: float, bucket_secs: float) -> None:
+        self.window_secs = window_secs
+        self.bucket_secs = bucket_secs
+        self.totals: Counter = Counter()
+        self._buckets: Deque[Tuple[int, Counter]] = deque()
+
+    def _expire(self, now: float) -> None:
+        oldest = int((now - self.window_secs) // self.bucket_secs)
+        while self._buckets and self._buckets[0][0] <= oldest:
+            _, counts = self._buckets.popleft()
+            self.totals.subtract(counts)
+        self.totals = +self.totals  # Drops the zero counts.
+
+    def add(self, key: str, count: int, now: float) -> None:
+        """Adds count to key at time now."""
+        self._expire(now)
+        bucket = int(now // self.bucket_secs)
+        if not self._buckets or self._buckets[-1][0] != bucket:
+            self._buckets.append((bucket, Counter()))
+        self._buckets[-1][1][key] += count
+        self.totals[key] += count
+
+    def rebuild(self, events: Iterable[Tuple[str, float]], now: float) -> None:
+        """Replaces the counts with the (key, time) events within the window."""
+        oldest = int((now - self.window_secs) // self.bucket_secs)
+        buckets: Dict[int, Counter] = {}
+        for key, at in events:
+            # Clock skew must not create buckets ahead of now.
+            bucket = int(min(at, now) // self.bucket_secs)
+            if bucket > oldest:
+                buckets.setdefault(bucket, Counter())[key] += 1
+        self._buckets = deque(sorted(buckets.items()))
+        self.totals = Counter()
+        for _, counts in self._buckets:
+            self.totals.update(counts)
+
+    def get(self, now: float) -> Dict[str, int]:
+        """Returns the counts per key within the window."""
+        self._expire(now)
+        return dict(self.totals)
+
+
+class VideoStats:  # pylint: disable=too-many-instance-attributes
+    """The aggregates behind /stats, safe to update from any thread."""
+
+    def __init__(self, retention_days: int = 7) -> None:
+        self.retention_days = retention_days
+        self.lock = threading.Lock()
+        self.reconciled_at: Optional[float] = None
+        self._ingest_1h = RollingCounter(60 * 60, 60)
+        self._ingest_24h = RollingCounter(DAY_SECS, 15 * 60)
+        # Videos recorded while a reconcile reads the database, with the time
+        # they were recorded, None when no reconcile is running.
+        self._pending: Optional[List[Tuple[StatsRow, float]]] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        # url -> (channel, published epoch, views)
+        self._videos = VideoStore()
+        self._daily: Dict[str, Counter] = {}
+        self._views_24h: Counter = Counter()
+        self._counted_24h: Set[str] = set()
+        self._heap_24h: List[Tuple[float, str]] = []
+
+    def _remove(self, url: str) -> None:
+        channel, published, views = self._videos.pop(url)
+        daily, day = self._daily[channel], _day(published)
+        daily[day] -= 1
+        if daily[day] <= 0:
+            del daily[day]
+            if not daily:
+                del self._daily[channel]
+        if url in self._counted_24h:
+            self._counted_24h.discard(url)
+            self._views_24h[channel] -= views
+            if self._views_24h[channel] <= 0:
+                del self._views_24h[channel]
+
+    def _add(  # pylint: disable=too-many-arguments
+        self, url: str, channel: str, published: float, views: int, now: float
+    ) -> None:
+        old = self._videos.get(url)
+        if old is not None:
+            self._remove(url)
+        if published < now - self.retention_days * DAY_SECS:
+            return
+        self._videos.put(url, channel, published, views)
+        self._daily.setdefault(channel, Counter())[_day(published)] += 1
+        if published >= now - DAY_SECS:
+            self._counted_24h.add(url)
+            self._views_24h[channel] += views
+            # A re-put with the same publish date keeps its heap entry.
+            if old is None or old[1] != published:
+                heapq.heappush(self._heap_24h, (published, url))
+                if len(self._heap_24h) > len(self._counted_24h) + MAX_STALE_HEAP:
+                    self._rebuild_heap()
+
+    def _rebuild_heap(self) -> None:
+        self._heap_24h = []
+        for url in self._counted_24h:
+            record = self._videos.get(url)
+            if record is not None:
+                self._heap_24h.append((record[1], url))
+        heapq.heapify(self._heap_24h)
+
+    def _expire_24h(self, now: float) -> None:
+        cutoff = now - DAY_SECS
+        while self._heap_24h and self._heap_24h[0][0] < cutoff:
+            published, url = heapq.heappop(self._heap_24h)
+            record = self._videos.get(url)
+            # Stale heap entries (re-dated or removed videos) are skipped.
+            if record is None or record[1] != published or url not in self._counted_24h:
+                continue
+            self._counted_24h.discard(url)
+            self._views_24h[record[0]] -= record[2]
+            if self._views_24h[record[0]] <= 0:
+                del self._views_24h[record[0]]
+
+    def record(self, vids: Iterable[VideoLike], now: Optional[float] = None) -> None:
+        """Folds written videos into the aggregates."""
+        now = time.time() if now is None else now
+        with self.lock:
+            self._expire_24h(now)
+            for vid in vids:
+                row = _fields(vid)
+                url, channel, source, published, views, _ = row
+                self._ingest_1h.add(source, 1, now)
+                self._ingest_24h.add(source, 1, now)
+                self._add(url, channel, published, views, now)
+                if self._pending is not None:
+                    self._pending.append((row, now))
+
+    def reconcile(
+        self, read: Callable[[], Iterable[StatsRow]], now: Optional[float] = None
+    ) -> None:
+        """
+        Rebuilds the aggregates from the rows of the retention window as
+        stored in the database, read() is usually read_recent(). The videos
+        recorded while read() runs are replayed on top of its rows.
+        """
+        with self.lock:
+            self._pending = []
+        try:
+            rows = list(read())
+        finally:
+            with self.lock:
+                pending, self._pending = self._pending, None
+        now = time.time() if now is None else now
+        with self.lock:
+            self._reset()
+            stored: Dict[str, float] = {}
+            events: List[Tuple[str, float]] = []
+            for url, channel, source, published, views, lastupdated in rows:
+                self._add(url, channel, published, views, now)
+                stored[url] = lastupdated
+                events.append((source, lastupdated))
+            for (url, channel, source, published, views, lastupdated), at in pending or []:
+                self._add(url, channel, published, views, now)
+                # Already counted if the read saw this version of the video.
+                if stored.get(url) != float(int(lastupdated)):
+                    events.append((source, at))
+            self._ingest_1h.rebuild(events, now)
+            self._ingest_24h.rebuild(events, now)
+            self.reconciled_at = now
+
+    def discard_channel(self, channel: str) -> None:
+        """Removes a deleted channel from the aggregates."""
+        with self.lock:
+            for url in self._videos.urls_of_channel(channel):
+                self._remove(url)
+
+    def clear(self) -> None:
+        """Removes all the videos from the aggregates."""
+        with self.lock:
+            self._reset()
+
+    def videos_per_channel_per_day(
+        self, channel: Optional[str] = None
+    ) -> Dict[str, Dict[str, int]]:
+        """Returns {channel: {day: count}}, optionally for one channel."""
+        with self.lock:
+            if channel is not None:
+                return {channel: dict(self._daily.get(channel, {}))}
+            return {name: dict(days) for name, days in self._daily.items()}
+
+    def top_channels_by_views(
+        self, limit: int = 10, now: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Returns the channels with the most views on videos from the last 24h."""
+        now = time.time() if now is None else now
+        with self.lock:
+            self._expire_24h(now)
+            top = self._views_24h.most_common(limit)
+        return [{"channel_name": name, "views": views} for name, views in top]
+
+    def ingest_rate_by_source(self, now: Optional[float] = None) -> Dict[str, Dict[str, int]]:
+        """
+        Returns {source: {"last_hour": n, "last_24h": n}} for all the workers
+        as of the last reconcile, plus the puts of this worker since.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            last_hour = self._ingest_1h.get(now)
+            last_day = self._ingest_24h.get(now)
+        return {
+            source: {"last_hour": last_hour.get(source, 0), "last_24h": count}
+            for source, count in last_day.items()
+        }
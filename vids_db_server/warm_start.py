@@ -0,0 +1,83 @@
+"""
+    Warm-start cache file for the hot in-memory structures of a worker.
+
+    Layout (all integers little endian):
+        8 bytes   magic  b"VDBWARM1"
+        8 bytes   length of the json index
+        N bytes   json index: {section_name: [offset, length], ...}
+        ...       raw section payloads (utf-8 json), offsets relative to file start
+
+    The file is memory mapped on load so that a worker only touches the pages of
+    the sections it actually decodes.
+"""
+
+import json
+import mmap
+import os
+import struct
+from typing import Any, Dict, Iterable, Optional
+
+MAGIC = b"VDBWARM1"
+_HEADER = struct.Struct("<8sQ")
+
+
+def save_warm_start(path: str, sections: Dict[str, Any]) -> None:
+    """
+    Writes the sections to the warm-start file. The file is written to a
+    temporary path and then atomically moved into place, so concurrent
+    workers never observe a partially written file.
+    """
+    payloads = {
+        name: json.dumps(data, ensure_ascii=False).encode("utf-8")
+        for name, data in sections.items()
+    }
+    # The index size depends on the offsets, which depend on the index size,
+    # so iterate until the index length is stable.
+    index_bytes = b""
+    while True:
+        offset = _HEADER.size + len(index_bytes)
+        index: Dict[str, list] = {}
+        for name, payload in payloads.items():
+            index[name] = [offset, len(payload)]
+            offset += len(payload)
+        new_index_bytes = json.dumps(index).encode("utf-8")
+        if len(new_index_bytes) == len(index_bytes):
+            index_bytes = new_index_bytes
+            break
+        index_bytes = new_index_bytes
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, mode="wb") as fd:
+        fd.write(_HEADER.pack(MAGIC, len(index_bytes)))
+        fd.write(index_bytes)
+        for payload in payloads.values():
+            fd.write(payload)
+    os.replace(tmp_path, path)
+
+
+def load_warm_start(
+    path: str, names: Optional[Iterable[str]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Returns the sections stored in the warm-start file, or None if the file
+    is missing or not a valid warm-start file. If names is given only those
+    sections are decoded, the others are never read from the mapping.
+    """
+    try:
+        with open(path, mode="rb") as fd:
+            if os.fstat(fd.fileno()).st_size < _HEADER.size:
+                return None
+            with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mem:
+                magic, index_len = _HEADER.unpack_from(mem, 0)
+                if magic != MAGIC:
+                    return None
+                index_end = _HEADER.size + index_len
+                index = json.loads(mem[_HEADER.size:index_end])
+                wanted = set(index) if names is None else set(names) & set(index)
+                out: Dict[str, Any] = {}
+                for name in wanted:
+                    offset, length = index[name]
+                    out[name] = json.loads(mem[offset:offset + length])
+                return out
+    except (OSError, ValueError, struct.error, TypeError, KeyError):
+        return None